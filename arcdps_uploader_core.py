@@ -0,0 +1,2396 @@
+import os
+import sys
+import time
+import threading
+import queue
+import json
+import random
+import hashlib
+import contextlib
+import sqlite3
+import mmap
+import shutil
+import tempfile
+import uuid
+import zipfile
+import zlib
+import collections
+import bisect
+import itertools
+import math
+import struct
+from array import array
+import configparser
+from datetime import datetime
+import logging
+
+# Watcher, upload and tracking core of the uploader, without any UI. requests, watchdog, psutil
+# and the web dashboard (arcdps_uploader_web) are imported where they are first used, so
+# importing this module stays cheap and works on any platform; the tray app in
+# arcdps_uploader_pro.py builds on top of it.
+
+CONFIG_FILE = "config.ini"
+UPLOADED_LOGS_TRACKER_FILE = "uploaded_logs.txt"
+UPLOADED_LOGS_DB_FILE = "uploaded_logs.db"
+UPLOAD_RETRY_STATE_FILE = "upload_retries.json"
+REPORT_CACHE_DIR = "report_cache"
+APP_NAME = "Arcdps Log Uploader"
+GAME_PROCESS_NAME = "Gw2-64.exe"
+LOG_EXTENSIONS = ('.evtc', '.zevtc')
+EVTC_HEADER = struct.Struct('<4s8sBHx')
+SCAN_MTIME_SLACK_NS = 2_000_000_000
+STORE_COMMIT_BATCH = 20
+STORE_COMMIT_INTERVAL = 2
+HASH_CHUNK_SIZE = 1024 * 1024
+DEFAULT_REPORT_CACHE_LIMIT_MB = 256
+# Boss names accepted in PriorityEncounters, mapped to the arcdps encounter (species) ID.
+ENCOUNTER_IDS = {
+    "vale guardian": 15438, "gorseval": 15429, "sabetha": 15375,
+    "slothasor": 16123, "matthias": 16115,
+    "keep construct": 16235, "xera": 16246,
+    "cairn": 17194, "mursaat overseer": 17172, "samarog": 17188, "deimos": 17154,
+    "soulless horror": 19767, "dhuum": 19450,
+    "conjured amalgamate": 43974, "twin largos": 21105, "qadim": 20934,
+    "cardinal adina": 22006, "cardinal sabir": 21964, "qadim the peerless": 22000,
+}
+REPORT_CACHE_SEGMENT_SIZE = 8 * 1024 * 1024
+DEFAULT_FILE_QUIET_PERIOD = 2.0
+DASHBOARD_PAGE_SIZE = 100
+DEFAULT_WEB_HISTORY_LIMIT = 500
+SSE_HEARTBEAT_INTERVAL = 15
+STATUS_MAX_UPDATES_PER_SECOND = 2
+GAME_PID_POLL_INTERVAL = 1.0
+GAME_SCAN_MIN_INTERVAL = 0.5
+GAME_SCAN_MAX_INTERVAL = 2.0
+GAME_FULL_RESCAN_EVERY = 30
+SSE_SEND_TIMEOUT = 2
+API_MAX_LIMIT = 500
+DEFAULT_UPLOAD_WORKERS = 2
+UPLOAD_QUEUE_MAXSIZE = 100
+UPLOAD_DRAIN_TIMEOUT = 10
+DPS_REPORT_UPLOAD_URL = "https://dps.report/uploadContent?json=1&generator=ei"
+DEFAULT_BACKFILL_WORKERS = 4
+BACKFILL_MAX_ATTEMPTS = 5
+BACKFILL_PROGRESS_INTERVAL = 5
+UPLOAD_TIMEOUT = 120
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 300
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+UPLOAD_CHUNK_SIZE = 64 * 1024
+DEFAULT_UPLOAD_RATE_WHILE_GAME_RUNNING = 0
+DEFAULT_UPLOAD_RATE_WHILE_GAME_CLOSED = 0
+THROTTLE_BURST_SECONDS = 1.0
+THROTTLE_MIN_FACTOR = 0.1
+THROTTLE_BUSY_PAUSE = 5
+THROTTLE_MAX_BUSY_PAUSE = 60
+THROTTLE_LATENCY_RATIO = 2.0
+THROUGHPUT_WINDOW = 5.0
+THROTTLE_REPORT_INTERVAL = 2
+METRIC_UPLOAD_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+METRIC_QUEUE_WAIT_BUCKETS = (0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+METRIC_SCAN_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+METRIC_HTTP_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)
+
+def file_fingerprint(file_path):
+    digest = hashlib.sha1()
+    size = 0
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            digest.update(chunk)
+    return size, digest.hexdigest()
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+class UploadProgress:
+    """Aggregate done/total counter for the current burst of uploads, with an ETA."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._total = 0
+        self._done = 0
+        self._started = None
+
+    def add(self, count=1):
+        with self._lock:
+            if self._started is None:
+                self._started = time.monotonic()
+            self._total += count
+
+    def discard(self, count=1):
+        with self._lock:
+            self._total = max(self._done, self._total - count)
+
+    def complete(self, count=1):
+        with self._lock:
+            self._done = min(self._total, self._done + count)
+
+    @property
+    def is_complete(self):
+        with self._lock:
+            return self._done >= self._total
+
+    def reset(self):
+        with self._lock:
+            self._total = self._done = 0
+            self._started = None
+
+    def describe(self):
+        with self._lock:
+            done, total, started = self._done, self._total, self._started
+        text = f"{done}/{total} logs processed"
+        if started is not None and 0 < done < total:
+            rate = done / max(time.monotonic() - started, 1e-6)
+            text += f", ETA {format_duration((total - done) / rate)}"
+        return text
+
+class AppStatus:
+    """Current application status, fanned out to listeners at a bounded rate.
+
+    set() only records the latest state; a dispatcher thread hands it to the listeners (log
+    file, dashboard events, and whatever the UI subscribes) at most STATUS_MAX_UPDATES_PER_SECOND times per
+    second, so bursts of changes collapse into one update and the final state always lands.
+    """
+
+    def __init__(self, app_instance, max_updates_per_second=STATUS_MAX_UPDATES_PER_SECOND):
+        self._app = app_instance
+        self._status = "PENDING"
+        self._details = "Initializing..."
+        self._min_interval = 1.0 / max_updates_per_second
+        self._listeners = [self._log_change, self._publish_event]
+        self._cond = threading.Condition()
+        self._dirty = False
+        self._last_delivered = None
+        threading.Thread(target=self._dispatch_loop, name="StatusDispatcher", daemon=True).start()
+
+    @property
+    def status_text(self):
+        return f"Status: {self._status} - {self._details}"
+
+    def as_event(self):
+        return {"status": self._status, "details": self._details}
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def set(self, status, details=""):
+        with self._cond:
+            self._status = status
+            self._details = details
+            self._dirty = True
+            self._cond.notify()
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while not self._dirty:
+                    self._cond.wait()
+                self._dirty = False
+                snapshot = (self._status, self._details)
+            if snapshot != self._last_delivered:
+                self._last_delivered = snapshot
+                for listener in self._listeners:
+                    try:
+                        listener(*snapshot)
+                    except Exception as e:
+                        logging.error("Status listener failed", exc_info=True)
+            time.sleep(self._min_interval)
+
+    def _log_change(self, status, details):
+        logging.info(f"Status changed: Status: {status} - {details}")
+
+    def _publish_event(self, status, details):
+        self._app.events.publish("status", {"status": status, "details": details})
+
+class CounterMetric:
+    """Monotonic counter, optionally split by label values."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(labels, value) for labels, value in self._values.items()]
+
+class HistogramMetric(CounterMetric):
+    """Fixed-bucket histogram; observe() is a bisect and three additions under a lock."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets, label_names=()):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            return [(labels, (list(counts), total, count)) for labels, (counts, total, count) in self._values.items()]
+
+class CallbackMetric:
+    """Gauge (or counter) read from the application only when metrics are collected."""
+
+    label_names = ()
+
+    def __init__(self, name, help_text, callback, kind="gauge"):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self._callback = callback
+
+    def samples(self):
+        try:
+            return [((), self._callback() or 0)]
+        except Exception as e:
+            logging.debug(f"Could not read metric {self.name}: {e}")
+            return []
+
+class MetricsRegistry:
+    """Holds the metrics and renders them as Prometheus text or as a JSON-friendly dict."""
+
+    def __init__(self):
+        self.started = time.time()
+        self._metrics = []
+
+    def counter(self, name, help_text, label_names=()):
+        return self._register(CounterMetric(name, help_text, label_names))
+
+    def histogram(self, name, help_text, buckets, label_names=()):
+        return self._register(HistogramMetric(name, help_text, buckets, label_names))
+
+    def gauge(self, name, help_text, callback, kind="gauge"):
+        return self._register(CallbackMetric(name, help_text, callback, kind))
+
+    def render_prometheus(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, value in metric.samples():
+                label_text = self._format_labels(metric.label_names, labels)
+                labels_part = f"{{{label_text}}}" if label_text else ""
+                if metric.kind != "histogram":
+                    lines.append(f"{metric.name}{labels_part} {self._format_value(value)}")
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(metric.buckets + (math.inf,), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == math.inf else repr(float(bound))
+                    separator = "," if label_text else ""
+                    lines.append(f'{metric.name}_bucket{{{label_text}{separator}le="{le}"}} {cumulative}')
+                lines.append(f"{metric.name}_sum{labels_part} {self._format_value(total)}")
+                lines.append(f"{metric.name}_count{labels_part} {count}")
+        return "\n".join(lines) + "\n"
+
+    def as_dict(self):
+        result = {"uptime_seconds": round(time.time() - self.started, 1), "metrics": {}}
+        for metric in self._metrics:
+            samples = []
+            for labels, value in metric.samples():
+                sample = {"labels": dict(zip(metric.label_names, labels))}
+                if metric.kind == "histogram":
+                    counts, total, count = value
+                    sample.update({
+                        "count": count, "sum": total,
+                        "buckets": {
+                            ("+Inf" if bound == math.inf else str(bound)): bucket_count
+                            for bound, bucket_count in zip(metric.buckets + (math.inf,), itertools.accumulate(counts))
+                        }
+                    })
+                else:
+                    sample["value"] = value
+                samples.append(sample)
+            result["metrics"][metric.name] = {"type": metric.kind, "help": metric.help_text, "samples": samples}
+        return result
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    @staticmethod
+    def _format_labels(names, values):
+        escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+    @staticmethod
+    def _format_value(value):
+        return str(value) if isinstance(value, int) else repr(float(value))
+
+class UploaderMetrics(MetricsRegistry):
+    """The uploader's metrics, served on /metrics and /api/stats.
+
+    Hot paths only touch counters and histograms; queue depths and other state are read from
+    the application when metrics are collected.
+    """
+
+    def __init__(self, app_instance):
+        super().__init__()
+        app = app_instance
+        self.uploads = self.counter(
+            "arcdps_uploads_total", "Logs processed by outcome (uploaded, reused, retry, failed).", ("result",)
+        )
+        self.upload_seconds = self.histogram(
+            "arcdps_upload_duration_seconds", "Time to hash and upload one log, by outcome.",
+            METRIC_UPLOAD_BUCKETS, ("result",)
+        )
+        self.upload_errors = self.counter(
+            "arcdps_upload_errors_total", "Failed upload attempts by error class.", ("error",)
+        )
+        self.bytes_sent = self.counter("arcdps_upload_bytes_sent_total", "Bytes sent to dps.report.")
+        self.bytes_saved = self.counter(
+            "arcdps_upload_bytes_saved_total", "Bytes saved by compressing .evtc logs before upload."
+        )
+        self.queue_wait_seconds = self.histogram(
+            "arcdps_upload_queue_wait_seconds", "Time logs spent in the upload queue before a worker took them.",
+            METRIC_QUEUE_WAIT_BUCKETS
+        )
+        self.handle_seconds = self.histogram(
+            "arcdps_log_handling_duration_seconds", "Time an upload worker spent on one queued log.",
+            METRIC_UPLOAD_BUCKETS
+        )
+        self.scan_seconds = self.histogram(
+            "arcdps_scan_duration_seconds", "Time to scan the log folder for logs not uploaded yet.",
+            METRIC_SCAN_BUCKETS
+        )
+        self.scan_found = self.counter("arcdps_scan_found_logs_total", "Logs found by folder scans.")
+        self.watcher_events = self.counter(
+            "arcdps_watcher_events_total", "File system events received from the folder watcher.", ("event",)
+        )
+        self.http_requests = self.counter(
+            "arcdps_http_requests_total", "Dashboard requests by path and status.", ("path", "status")
+        )
+        self.http_seconds = self.histogram(
+            "arcdps_http_request_duration_seconds", "Time to answer dashboard requests.",
+            METRIC_HTTP_BUCKETS, ("path",)
+        )
+        self.gauge(
+            "arcdps_upload_queue_depth", "Logs waiting in the upload queue.",
+            lambda: app.upload_pipeline.pending if app.upload_pipeline else 0
+        )
+        self.gauge("arcdps_uploads_in_flight", "Logs queued or being uploaded.", lambda: len(app.in_flight))
+        self.gauge(
+            "arcdps_logs_awaiting_quiet_period", "New logs waiting for arcdps to finish writing them.",
+            lambda: len(app.readiness) if app.readiness else 0
+        )
+        self.gauge("arcdps_retries_scheduled", "Failed uploads waiting to be retried.", lambda: len(app.retry_queue))
+        self.gauge(
+            "arcdps_uploaded_logs", "Logs recorded in the upload store.",
+            lambda: len(app.upload_store) if app.upload_store else 0
+        )
+        self.gauge(
+            "arcdps_duplicate_uploads_prevented_total", "Uploads skipped because the same log was already queued.",
+            lambda: app.in_flight.duplicates_prevented, kind="counter"
+        )
+        self.gauge("arcdps_dashboard_event_clients", "Open dashboard live-update connections.", lambda: len(app.events))
+        self.gauge("arcdps_upload_rate_limit_bytes", "Current upload limit in bytes/s (0 = unlimited).",
+                   lambda: app.upload_limiter.rate)
+        self.gauge("arcdps_upload_throughput_bytes", "Recent upload throughput in bytes/s.",
+                   lambda: app.upload_limiter.throughput())
+        self.gauge(
+            "arcdps_report_cache_bytes", "Size of the local report cache.",
+            lambda: app.report_cache.size if app.report_cache is not None else 0
+        )
+        self.gauge(
+            "arcdps_report_cache_reports", "Reports in the local report cache.",
+            lambda: len(app.report_cache) if app.report_cache is not None else 0
+        )
+        self.gauge("arcdps_sleeping", "1 while uploads are paused by the game-state settings.",
+                   lambda: int(app.is_sleeping))
+        self.gauge("arcdps_uptime_seconds", "Seconds since the uploader started.", lambda: time.time() - self.started)
+
+class UploadPipeline:
+    """Bounded work queue drained by a fixed pool of upload worker threads."""
+
+    _STOP = object()
+    _STOP_PRIORITY = (math.inf,)
+
+    def __init__(self, handler, num_workers, maxsize=UPLOAD_QUEUE_MAXSIZE, on_idle=None):
+        self._handler = handler
+        self._num_workers = max(1, num_workers)
+        # Entries are (priority, sequence, file_path); lower priorities are uploaded first
+        # and the sequence keeps equal priorities in submission order.
+        self._queue = queue.PriorityQueue(maxsize=maxsize)
+        self._sequence = itertools.count()
+        self._on_idle = on_idle
+        self._workers = []
+        self._accepting = False
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+
+    @property
+    def pending(self):
+        with self._pending_lock:
+            return self._pending
+
+    def start(self):
+        self._accepting = True
+        for i in range(self._num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"UploadWorker-{i+1}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        logging.info(f"Upload pipeline started with {self._num_workers} worker(s).")
+
+    def submit(self, file_path, priority=(0, 0)):
+        # Blocks while the queue is full so producers (watcher, scanner) are throttled
+        # to the speed of the workers instead of piling up threads.
+        with self._pending_lock:
+            self._pending += 1
+        entry = (priority, next(self._sequence), file_path)
+        while self._accepting:
+            try:
+                self._queue.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        self._task_finished()
+        return False
+
+    def stop(self, drain=False, timeout=UPLOAD_DRAIN_TIMEOUT):
+        if not self._accepting:
+            return
+        self._accepting = False
+        dropped = 0
+        if not drain:
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._queue.task_done()
+                dropped += 1
+            with self._pending_lock:
+                self._pending -= dropped
+        if dropped:
+            logging.info(f"Upload pipeline stopping: {dropped} queued log(s) left for the next run.")
+        for _ in self._workers:
+            self._queue.put((self._STOP_PRIORITY, next(self._sequence), self._STOP))
+        # timeout=None waits for every upload in flight, however long it takes.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(None if deadline is None else max(0, deadline - time.monotonic()))
+        still_running = sum(1 for worker in self._workers if worker.is_alive())
+        if still_running:
+            logging.warning(f"Upload pipeline stopped with {still_running} upload(s) still in flight.")
+        else:
+            logging.info("Upload pipeline stopped.")
+
+    def _worker_loop(self):
+        while True:
+            _, _, file_path = self._queue.get()
+            try:
+                if file_path is self._STOP:
+                    return
+                self._handler(file_path)
+            except Exception as e:
+                logging.error(f"Upload worker failed on {file_path}", exc_info=True)
+            finally:
+                self._queue.task_done()
+                if file_path is not self._STOP:
+                    self._task_finished()
+
+    def _task_finished(self):
+        with self._pending_lock:
+            self._pending -= 1
+            idle = self._pending == 0
+        if idle and self._accepting and self._on_idle:
+            self._on_idle()
+
+class RetryableUploadError(Exception):
+    """Upload failed for a transient reason and should be tried again later."""
+
+    def __init__(self, message, retry_after=None, disconnected=False, status_code=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.disconnected = disconnected
+        self.status_code = status_code
+
+def error_class(error):
+    """Short label for an upload failure: the HTTP status when there is one, else the exception type."""
+    if isinstance(error, RetryableUploadError):
+        if error.status_code:
+            return f"http_{error.status_code}"
+        error = error.__cause__ or error
+    response = getattr(error, 'response', None)
+    if response is not None:
+        return f"http_{response.status_code}"
+    return type(error).__name__
+
+def parse_priority_encounters(value):
+    """Encounter IDs from the PriorityEncounters setting, highest priority first.
+
+    Entries are comma-separated encounter IDs or boss names from ENCOUNTER_IDS; anything
+    else is skipped with a warning.
+    """
+    encounter_ids = []
+    for entry in value.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        if entry.lower() in ENCOUNTER_IDS:
+            encounter_ids.append(ENCOUNTER_IDS[entry.lower()])
+            continue
+        # Space-separated IDs are accepted too.
+        for token in entry.split():
+            try:
+                encounter_ids.append(int(token))
+            except ValueError:
+                logging.warning(f"PriorityEncounters: ignoring {entry!r}, not an encounter ID or known boss name.")
+                break
+    return encounter_ids
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class UploadRateLimiter:
+    """Token bucket shared by all upload workers.
+
+    It has separate byte-rate limits for while the game is running and while it is closed
+    (0 means unlimited). An adaptive factor halves the effective limit, and holds back new uploads
+    briefly, when dps.report answers 429/503. It also shrinks the limit when server latency
+    climbs well above its running average and recovers as responses speed up again.
+    """
+
+    def __init__(self, rate_while_game_running=0, rate_while_game_closed=0):
+        self._rates = {True: rate_while_game_running, False: rate_while_game_closed}
+        self.game_running = False
+        self._factor = 1.0
+        self._tokens = 0.0
+        self._last_refill = time.monotonic()
+        self._pause_until = 0.0
+        self._latency_average = None
+        self._recent = collections.deque()
+        self._lock = threading.Lock()
+
+    @property
+    def is_game_sensitive(self):
+        return self._rates[True] != self._rates[False]
+
+    @property
+    def rate(self):
+        base = self._rates[self.game_running]
+        return base * self._factor if base else 0
+
+    def set_game_running(self, running):
+        with self._lock:
+            if running != self.game_running:
+                self.game_running = running
+                logging.info(f"Upload throttle switched: {self._describe_limit()}")
+
+    def wait_until_ready(self):
+        """Sleep out a busy pause before an upload starts, never halfway through its body."""
+        while True:
+            with self._lock:
+                delay = self._pause_until - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def consume(self, nbytes):
+        # Byte-rate pacing only; busy pauses are applied by wait_until_ready().
+        with self._lock:
+            now = time.monotonic()
+            delay = 0.0
+            rate = self.rate
+            if rate:
+                # Deficit bucket: the chunk is always taken and the caller sleeps off any debt.
+                self._tokens = min(rate * THROTTLE_BURST_SECONDS, self._tokens + (now - self._last_refill) * rate)
+                self._tokens -= nbytes
+                if self._tokens < 0:
+                    delay = max(delay, -self._tokens / rate)
+            self._last_refill = now
+            self._recent.append((now + delay, nbytes))
+        if delay > 0:
+            time.sleep(delay)
+
+    def record_busy(self, retry_after=None):
+        with self._lock:
+            self._factor = max(THROTTLE_MIN_FACTOR, self._factor / 2)
+            pause = min(THROTTLE_MAX_BUSY_PAUSE, retry_after or THROTTLE_BUSY_PAUSE)
+            self._pause_until = max(self._pause_until, time.monotonic() + pause)
+            logging.warning(f"dps.report is busy; backing off. {self._describe_limit()}")
+
+    def record_latency(self, seconds):
+        with self._lock:
+            if self._latency_average is not None and seconds > self._latency_average * THROTTLE_LATENCY_RATIO:
+                self._factor = max(THROTTLE_MIN_FACTOR, self._factor * 0.75)
+            else:
+                self._factor = min(1.0, self._factor * 1.1)
+            if self._latency_average is None:
+                self._latency_average = seconds
+            else:
+                self._latency_average = 0.9 * self._latency_average + 0.1 * seconds
+
+    def throughput(self):
+        with self._lock:
+            cutoff = time.monotonic() - THROUGHPUT_WINDOW
+            while self._recent and self._recent[0][0] < cutoff:
+                self._recent.popleft()
+            return sum(nbytes for _, nbytes in self._recent) / THROUGHPUT_WINDOW
+
+    def describe(self):
+        throughput = self.throughput()
+        with self._lock:
+            text = f"{self._describe_limit()}, sending {throughput / 1024:.0f} KB/s"
+            paused_for = self._pause_until - time.monotonic()
+        if paused_for > 0:
+            text += f", paused {paused_for:.0f}s"
+        return text
+
+    def _describe_limit(self):
+        mode = "game running" if self.game_running else "game closed"
+        rate = self.rate
+        limit = f"{rate / 1024:.0f} KB/s" if rate else "unlimited"
+        backoff = f", backed off to {self._factor:.0%}" if self._factor < 1.0 and rate else ""
+        return f"Upload limit: {limit} ({mode}{backoff})"
+
+class MultipartFileStream:
+    """multipart/form-data body for a single file field, streamed in fixed-size chunks.
+
+    The file is memory-mapped and sent as memoryview slices of the mapping, so the payload
+    is never copied into Python buffers; the known length lets requests send a plain
+    Content-Length instead of chunked transfer encoding.
+    """
+
+    def __init__(self, fileobj, filename, field_name='file', chunk_size=UPLOAD_CHUNK_SIZE, limiter=None):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self._file = fileobj
+        self._size = os.fstat(fileobj.fileno()).st_size
+        self._chunk_size = chunk_size
+        self._mapped = None
+        self._limiter = limiter
+        self.finished_at = None
+        self._head = (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{filename}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n"
+        ).encode('utf-8')
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode('utf-8')
+
+    def __len__(self):
+        return len(self._head) + self._size + len(self._tail)
+
+    def __iter__(self):
+        yield self._head
+        if self._size:
+            if self._mapped is None:
+                self._mapped = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(self._mapped)
+            for offset in range(0, self._size, self._chunk_size):
+                chunk = view[offset:offset + self._chunk_size]
+                if self._limiter:
+                    self._limiter.consume(len(chunk))
+                yield chunk
+        yield self._tail
+        self.finished_at = time.monotonic()
+
+    def close(self):
+        if self._mapped is not None:
+            try:
+                self._mapped.close()
+            except BufferError:
+                # A chunk is still referenced by the HTTP stack; the mapping is
+                # released when that reference is collected.
+                pass
+            self._mapped = None
+
+class DpsReportClient:
+    """Uploads logs to dps.report over one pooled keep-alive session shared by all workers."""
+
+    def __init__(self, upload_url=DPS_REPORT_UPLOAD_URL, pool_size=DEFAULT_UPLOAD_WORKERS, timeout=UPLOAD_TIMEOUT,
+                 limiter=None):
+        self.upload_url = upload_url
+        self.timeout = timeout
+        self.limiter = limiter
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._stats = {"uploads": 0, "bytes_sent": 0, "bytes_saved": 0, "seconds": 0.0}
+        self._stats_lock = threading.Lock()
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def upload(self, file_path, filename):
+        """Upload one log; returns the dps.report JSON and a dict describing the transfer."""
+        import requests
+        if self.limiter:
+            self.limiter.wait_until_ready()
+        try:
+            with self._open_payload(file_path) as (payload, upload_name, original_size):
+                stream = MultipartFileStream(payload, upload_name, limiter=self.limiter)
+                started = time.monotonic()
+                try:
+                    response = self.session.post(
+                        self.upload_url, data=stream, headers={'Content-Type': stream.content_type},
+                        timeout=self.timeout
+                    )
+                finally:
+                    stream.close()
+                finished = time.monotonic()
+                elapsed = finished - started
+                bytes_sent = os.fstat(payload.fileno()).st_size
+        except requests.exceptions.ConnectionError as e:
+            raise RetryableUploadError("Connection to dps.report failed.", disconnected=True) from e
+        except requests.exceptions.Timeout as e:
+            raise RetryableUploadError("Upload to dps.report timed out.") from e
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if self.limiter:
+            if response.status_code in (429, 503):
+                self.limiter.record_busy(retry_after)
+            elif stream.finished_at is not None:
+                # Time between the last byte sent and the response: dps.report's processing latency.
+                self.limiter.record_latency(finished - stream.finished_at)
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            raise RetryableUploadError(
+                f"dps.report responded with HTTP {response.status_code}.", retry_after=retry_after,
+                status_code=response.status_code
+            )
+        response.raise_for_status()
+        data = response.json()
+        transfer = {
+            "bytes_sent": bytes_sent,
+            "bytes_saved": original_size - bytes_sent,
+            "seconds": elapsed,
+            "bytes_per_second": bytes_sent / elapsed if elapsed > 0 else 0.0
+        }
+        with self._stats_lock:
+            self._stats["uploads"] += 1
+            self._stats["bytes_sent"] += bytes_sent
+            self._stats["bytes_saved"] += transfer["bytes_saved"]
+            self._stats["seconds"] += elapsed
+        return data, transfer
+
+    @contextlib.contextmanager
+    def _open_payload(self, file_path):
+        original_size = os.path.getsize(file_path)
+        upload_name = os.path.basename(file_path)
+        if not upload_name.endswith('.evtc'):
+            with open(file_path, 'rb') as f:
+                yield f, upload_name, original_size
+            return
+        # Raw arcdps output: zip it into a .zevtc on disk chunk by chunk, so the whole
+        # log is never held in memory and dps.report receives the smaller archive.
+        with tempfile.TemporaryFile() as compressed:
+            with zipfile.ZipFile(compressed, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                with open(file_path, 'rb') as source, archive.open(upload_name, 'w') as target:
+                    shutil.copyfileobj(source, target, UPLOAD_CHUNK_SIZE)
+            compressed.flush()
+            compressed.seek(0)
+            yield compressed, upload_name[:-len('.evtc')] + '.zevtc', original_size
+
+    def close(self):
+        self.session.close()
+
+class RetryQueue:
+    """Persistent schedule of failed uploads, retried with exponential backoff and jitter."""
+
+    def __init__(self, submit, state_file=UPLOAD_RETRY_STATE_FILE):
+        self._submit = submit
+        self._state_file = state_file
+        self._entries = {}
+        self._cond = threading.Condition()
+        self._running = False
+
+    def __len__(self):
+        with self._cond:
+            return len(self._entries)
+
+    def load(self):
+        try:
+            if os.path.exists(self._state_file):
+                with open(self._state_file, 'r') as f:
+                    entries = json.load(f)
+                with self._cond:
+                    self._entries = {
+                        path: {"attempts": int(entry.get("attempts", 0)), "next_attempt": 0.0}
+                        for path, entry in entries.items() if os.path.exists(path)
+                    }
+                logging.info(f"Loaded {len(self._entries)} pending upload retries.")
+        except Exception as e:
+            logging.error("Could not read retry state file", exc_info=True)
+
+    def is_scheduled(self, file_path):
+        with self._cond:
+            return file_path in self._entries
+
+    def schedule(self, file_path, retry_after=None):
+        with self._cond:
+            entry = self._entries.setdefault(file_path, {"attempts": 0, "next_attempt": 0.0})
+            delay = self.backoff_delay(entry["attempts"])
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            entry["attempts"] += 1
+            entry["next_attempt"] = time.time() + delay
+            self._save()
+            self._cond.notify()
+        logging.info(f"Scheduled retry #{entry['attempts']} for {os.path.basename(file_path)} in {delay:.1f}s.")
+
+    def discard(self, file_path):
+        with self._cond:
+            if self._entries.pop(file_path, None) is not None:
+                self._save()
+
+    @staticmethod
+    def backoff_delay(attempts):
+        delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempts))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def run(self):
+        self._running = True
+        logging.info("Starting upload retry loop.")
+        while True:
+            with self._cond:
+                due = self._take_due()
+                while self._running and not due:
+                    self._cond.wait(self._seconds_until_next())
+                    due = self._take_due()
+                if not self._running:
+                    return
+            for file_path in due:
+                self._submit(file_path)
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+    def _take_due(self):
+        # Lease due entries by pushing their next attempt out as if this try fails too;
+        # a success discards the entry and a retryable failure reschedules it.
+        now = time.time()
+        due = [path for path, entry in self._entries.items() if entry["next_attempt"] <= now]
+        for path in due:
+            entry = self._entries[path]
+            entry["next_attempt"] = now + self.backoff_delay(entry["attempts"])
+        if due:
+            self._save()
+        return due
+
+    def _seconds_until_next(self):
+        if not self._entries:
+            return None
+        return max(0.0, min(entry["next_attempt"] for entry in self._entries.values()) - time.time())
+
+    def _save(self):
+        try:
+            tmp_file = self._state_file + ".tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_file, self._state_file)
+        except Exception as e:
+            logging.error("Could not write retry state file", exc_info=True)
+
+class EvtcHeader:
+    __slots__ = ('arcdps_build', 'revision', 'encounter_id', 'size', 'mtime')
+
+    def __init__(self, arcdps_build, revision, encounter_id, size, mtime):
+        self.arcdps_build = arcdps_build
+        self.revision = revision
+        self.encounter_id = encounter_id
+        self.size = size
+        self.mtime = mtime
+
+def parse_evtc_header(file_path):
+    """Read the 16-byte EVTC header of a raw or zipped log without touching the rest of it.
+
+    Returns None if the file is not a readable arcdps log.
+    """
+    try:
+        stat = os.stat(file_path)
+        if file_path.endswith('.zevtc'):
+            with zipfile.ZipFile(file_path) as archive:
+                members = archive.infolist()
+                if not members:
+                    return None
+                with archive.open(members[0]) as log:
+                    raw = log.read(EVTC_HEADER.size)
+        else:
+            with open(file_path, 'rb') as log:
+                raw = log.read(EVTC_HEADER.size)
+        if len(raw) < EVTC_HEADER.size:
+            return None
+        magic, build, revision, encounter_id = EVTC_HEADER.unpack(raw)
+        if magic != b'EVTC':
+            return None
+        return EvtcHeader(build.decode('ascii', 'replace'), revision, encounter_id, stat.st_size, stat.st_mtime)
+    except (OSError, zipfile.BadZipFile, RuntimeError) as e:
+        logging.debug(f"Could not read EVTC header of {file_path}: {e}")
+        return None
+
+class LogMetadataIndex:
+    """Parsed EVTC headers by log path, re-read only when a file's size or mtime changes."""
+
+    def __init__(self):
+        self._headers = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._headers)
+
+    def get(self, file_path):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        with self._lock:
+            header = self._headers.get(file_path)
+        if header and header.size == stat.st_size and header.mtime == stat.st_mtime:
+            return header
+        header = parse_evtc_header(file_path)
+        if header:
+            with self._lock:
+                self._headers[file_path] = header
+        return header
+
+    def discard(self, file_path):
+        with self._lock:
+            self._headers.pop(file_path, None)
+
+class IncrementalLogScanner:
+    """Walks the log folder with os.scandir, re-listing only directories whose mtime changed.
+
+    A directory's mtime moves whenever an entry is created, deleted or renamed in it, so an
+    unchanged directory reuses its cached subdirectories and not-yet-uploaded log names and
+    costs a single stat per pass.
+    """
+
+    def __init__(self, root_folder):
+        self.root_folder = root_folder
+        self._index = {}
+        self._lock = threading.Lock()
+        self.last_stats = {}
+
+    def scan(self, filter_unprocessed):
+        with self._lock:
+            stats = {"directories": 0, "directories_unchanged": 0, "entries_listed": 0, "entries_skipped": 0}
+            new_index = {}
+            candidates = []
+            stack = [self.root_folder]
+            while stack:
+                dir_path = stack.pop()
+                try:
+                    mtime_ns = os.stat(dir_path).st_mtime_ns
+                except OSError:
+                    continue
+                stats["directories"] += 1
+                cached = self._index.get(dir_path)
+                # A listing taken within the filesystem's timestamp granularity of the last
+                # change could have missed a same-tick write, so it is not trusted.
+                if cached and cached["mtime_ns"] == mtime_ns and cached["listed_at_ns"] - mtime_ns > SCAN_MTIME_SLACK_NS:
+                    entry = cached
+                    stats["directories_unchanged"] += 1
+                    stats["entries_skipped"] += entry["entry_count"]
+                else:
+                    entry = self._list_directory(dir_path, mtime_ns)
+                    if entry is None:
+                        continue
+                    stats["entries_listed"] += entry["entry_count"]
+                new_index[dir_path] = entry
+                candidates.extend(os.path.join(dir_path, name) for name in entry["pending"])
+                stack.extend(entry["subdirs"])
+
+            unprocessed = filter_unprocessed(candidates)
+            pending_by_dir = {}
+            for file_path in unprocessed:
+                dir_path, name = os.path.split(file_path)
+                pending_by_dir.setdefault(dir_path, []).append(name)
+            for dir_path, entry in new_index.items():
+                entry["pending"] = pending_by_dir.get(dir_path, [])
+            self._index = new_index
+            stats["candidates"] = len(candidates)
+            stats["unprocessed"] = len(unprocessed)
+            self.last_stats = stats
+            return unprocessed
+
+    def _list_directory(self, dir_path, mtime_ns):
+        subdirs, log_names, entry_count = [], [], 0
+        listed_at_ns = time.time_ns()
+        try:
+            with os.scandir(dir_path) as entries:
+                for dir_entry in entries:
+                    entry_count += 1
+                    try:
+                        if dir_entry.is_dir(follow_symlinks=False):
+                            subdirs.append(dir_entry.path)
+                        elif dir_entry.name.endswith(LOG_EXTENSIONS):
+                            log_names.append(dir_entry.name)
+                    except OSError:
+                        continue
+        except OSError as e:
+            logging.warning(f"Could not scan {dir_path}: {e}")
+            return None
+        return {
+            "mtime_ns": mtime_ns,
+            "listed_at_ns": listed_at_ns,
+            "subdirs": subdirs,
+            "pending": log_names,
+            "entry_count": entry_count
+        }
+
+class UploadStore:
+    """SQLite (WAL) record of uploaded logs, keyed by path relative to the log folder.
+
+    Lookups are served from an in-memory set loaded at startup; writes are buffered and
+    committed in batches by a background flusher.
+    """
+
+    def __init__(self, db_file, root_folder, commit_batch=STORE_COMMIT_BATCH):
+        self._db_file = db_file
+        self._root_folder = root_folder
+        self._commit_batch = max(1, commit_batch)
+        self._conn = None
+        self._lock = threading.Lock()
+        self._paths = set()
+        self._legacy_names = set()
+        self._pending_rows = []
+        self._stop_event = threading.Event()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._paths) + len(self._legacy_names)
+
+    def open(self, legacy_tracker_file=UPLOADED_LOGS_TRACKER_FILE):
+        self._conn = sqlite3.connect(self._db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS uploads (
+                rel_path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                permalink TEXT,
+                boss TEXT,
+                success INTEGER NOT NULL DEFAULT 0,
+                upload_time TEXT NOT NULL,
+                bytes_sent INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS uploads_content ON uploads (size, content_hash);
+            CREATE TABLE IF NOT EXISTS legacy_names (name TEXT PRIMARY KEY);
+        """)
+        self._conn.commit()
+        self._migrate_tracker_file(legacy_tracker_file)
+        with self._lock:
+            self._paths = {row[0] for row in self._conn.execute("SELECT rel_path FROM uploads")}
+            self._legacy_names = {row[0] for row in self._conn.execute("SELECT name FROM legacy_names")}
+        logging.info(f"Loaded {len(self._paths)} uploaded logs and {len(self._legacy_names)} legacy entries.")
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def close(self):
+        self._stop_event.set()
+        if self._conn:
+            self.flush()
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+    def relative_key(self, file_path):
+        rel_path = os.path.relpath(os.path.abspath(file_path), os.path.abspath(self._root_folder))
+        if rel_path.startswith(os.pardir):
+            rel_path = os.path.abspath(file_path)
+        return os.path.normcase(rel_path)
+
+    def is_processed(self, file_path):
+        key = self.relative_key(file_path)
+        with self._lock:
+            return key in self._paths or os.path.basename(file_path) in self._legacy_names
+
+    def filter_unprocessed(self, file_paths):
+        keys = [(path, self.relative_key(path)) for path in file_paths]
+        with self._lock:
+            return [
+                path for path, key in keys
+                if key not in self._paths and os.path.basename(path) not in self._legacy_names
+            ]
+
+    def find_by_content(self, size, content_hash):
+        with self._lock:
+            # Rows waiting for the next batch commit are not in the database yet.
+            for pending in reversed(self._pending_rows):
+                if pending[1] == size and pending[2] == content_hash:
+                    return {"permalink": pending[3], "boss": pending[4], "success": bool(pending[5])}
+            row = self._conn.execute(
+                "SELECT permalink, boss, success FROM uploads WHERE size = ? AND content_hash = ? LIMIT 1",
+                (size, content_hash)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"permalink": row[0], "boss": row[1], "success": bool(row[2])}
+
+    def record_upload(self, file_path, size, content_hash, permalink, boss, success, upload_time, bytes_sent):
+        key = self.relative_key(file_path)
+        with self._lock:
+            self._paths.add(key)
+            self._pending_rows.append((key, size, content_hash, permalink, boss, int(bool(success)), upload_time, bytes_sent))
+            batch_full = len(self._pending_rows) >= self._commit_batch
+        if batch_full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._pending_rows or self._conn is None:
+                return
+            rows, self._pending_rows = self._pending_rows, []
+            try:
+                with self._conn:
+                    self._conn.executemany("INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            except sqlite3.Error as e:
+                logging.critical("Could not write to upload store", exc_info=True)
+                self._pending_rows = rows + self._pending_rows
+    
+    def _flush_loop(self):
+        while not self._stop_event.wait(STORE_COMMIT_INTERVAL):
+            self.flush()
+
+    def _migrate_tracker_file(self, tracker_file):
+        if not tracker_file or not os.path.exists(tracker_file):
+            return
+        try:
+            with open(tracker_file, 'r') as f:
+                names = [(line.strip(),) for line in f if line.strip()]
+            with self._conn:
+                self._conn.executemany("INSERT OR IGNORE INTO legacy_names VALUES (?)", names)
+            os.replace(tracker_file, tracker_file + ".migrated")
+            logging.info(f"Migrated {len(names)} entries from {tracker_file} to {self._db_file}.")
+        except Exception as e:
+            logging.error("Could not migrate tracker file", exc_info=True)
+
+class ReportCache:
+    """Local copy of the full dps.report response for every upload, with a searchable index.
+
+    Responses are zlib-compressed and appended to segment files under the cache folder; a
+    SQLite index next to them maps boss, result, encounter time and log path to each record.
+    Segments are never rewritten. Once the cache grows past its size limit, whole segments
+    are deleted oldest first, together with their index rows. Appends happen inside a write
+    transaction on the index, so the tray app and a --backfill run can share one cache.
+    """
+
+    def __init__(self, cache_dir, limit_bytes, segment_size=REPORT_CACHE_SEGMENT_SIZE):
+        self._cache_dir = cache_dir
+        self._limit_bytes = limit_bytes
+        # Evict in steps of at most a quarter of the limit.
+        self._segment_size = max(64 * 1024, min(segment_size, limit_bytes // 4))
+        self._conn = None
+        self._lock = threading.Lock()
+        self._segments = {}
+        self._active = None
+
+    @property
+    def size(self):
+        with self._lock:
+            return sum(self._segments.values())
+
+    def __len__(self):
+        with self._lock:
+            if self._conn is None:
+                return 0
+            return self._conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+    def open(self):
+        os.makedirs(self._cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self._cache_dir, "index.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS reports (
+                id INTEGER PRIMARY KEY,
+                rel_path TEXT NOT NULL,
+                permalink TEXT,
+                boss TEXT COLLATE NOCASE,
+                boss_id INTEGER,
+                success INTEGER NOT NULL DEFAULT 0,
+                is_cm INTEGER NOT NULL DEFAULT 0,
+                encounter_time INTEGER NOT NULL,
+                duration REAL,
+                comp_dps INTEGER,
+                segment INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS reports_time ON reports (encounter_time);
+            CREATE INDEX IF NOT EXISTS reports_boss ON reports (boss, encounter_time);
+            CREATE INDEX IF NOT EXISTS reports_success ON reports (success, encounter_time);
+            CREATE INDEX IF NOT EXISTS reports_path ON reports (rel_path);
+            CREATE INDEX IF NOT EXISTS reports_segment ON reports (segment);
+        """)
+        self._conn.commit()
+        with self._lock:
+            self._load_segments()
+        logging.info(f"Report cache: {len(self)} reports, {self.size / 1048576:.1f} MB in {self._cache_dir}.")
+
+    def close(self):
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+
+    def add(self, rel_path, data):
+        """Append one dps.report response; returns its id in the index."""
+        record = zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        encounter = data.get('encounter') or {}
+        encounter_time = data.get('encounterTime') or data.get('uploadTime') or time.time()
+        with self._lock:
+            if self._conn is None:
+                return None
+            # The index's write lock also serialises appends from other processes, so the
+            # segment's size on disk is where this record starts.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._load_segments()
+                if self._active == 0 or self._segments[self._active] >= self._segment_size:
+                    self._active += 1
+                    self._segments[self._active] = 0
+                with open(self._segment_path(self._active), 'ab') as f:
+                    offset = f.seek(0, os.SEEK_END)
+                    f.write(record)
+                self._segments[self._active] = offset + len(record)
+                cursor = self._conn.execute(
+                    "INSERT INTO reports (rel_path, permalink, boss, boss_id, success, is_cm, encounter_time, "
+                    "duration, comp_dps, segment, offset, length) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        rel_path, data.get('permalink'), encounter.get('boss'), encounter.get('bossId'),
+                        int(bool(encounter.get('success'))), int(bool(encounter.get('isCm'))), int(encounter_time),
+                        self._number(encounter.get('duration')), self._number(encounter.get('compDps')),
+                        self._active, offset, len(record)
+                    )
+                )
+                self._evict()
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            return cursor.lastrowid
+
+    def get(self, report_id):
+        """The full dps.report response for an id from search(), or None if it was evicted."""
+        with self._lock:
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                "SELECT segment, offset, length FROM reports WHERE id = ?", (report_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            segment, offset, length = row
+            try:
+                with open(self._segment_path(segment), 'rb') as f:
+                    f.seek(offset)
+                    record = f.read(length)
+            except OSError:
+                return None
+        try:
+            return json.loads(zlib.decompress(record))
+        except (zlib.error, ValueError) as e:
+            logging.warning(f"Report {report_id} in the report cache is unreadable: {e}")
+            return None
+
+    def search(self, boss=None, success=None, since=None, until=None, text=None, offset=0, limit=DASHBOARD_PAGE_SIZE):
+        """Index rows matching every given filter, newest encounter first; returns (total, rows)."""
+        conditions, params = [], []
+        if boss:
+            conditions.append("boss = ?")
+            params.append(boss)
+        if success is not None:
+            conditions.append("success = ?")
+            params.append(int(bool(success)))
+        if since is not None:
+            conditions.append("encounter_time >= ?")
+            params.append(int(since))
+        if until is not None:
+            conditions.append("encounter_time < ?")
+            params.append(int(until))
+        if text:
+            conditions.append("(boss LIKE ? OR rel_path LIKE ?)")
+            params.extend([f"%{text}%"] * 2)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            if self._conn is None:
+                return 0, []
+            total = self._conn.execute(f"SELECT COUNT(*) FROM reports {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT id, rel_path, permalink, boss, boss_id, success, is_cm, encounter_time, duration, comp_dps "
+                f"FROM reports {where} ORDER BY encounter_time DESC, id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        columns = ("id", "log_path", "permalink", "boss", "boss_id", "success", "is_cm", "encounter_time",
+                   "duration", "comp_dps")
+        reports = [dict(zip(columns, row)) for row in rows]
+        for report in reports:
+            report["success"] = bool(report["success"])
+            report["is_cm"] = bool(report["is_cm"])
+        return total, reports
+
+    def bosses(self):
+        """(boss, report count) for every boss in the cache, most reports first."""
+        with self._lock:
+            if self._conn is None:
+                return []
+            return self._conn.execute(
+                "SELECT boss, COUNT(*) FROM reports WHERE boss IS NOT NULL GROUP BY boss ORDER BY COUNT(*) DESC, boss"
+            ).fetchall()
+
+    def _load_segments(self):
+        # Segment sizes come from disk, since another process may have appended or evicted.
+        self._segments = {}
+        for name in os.listdir(self._cache_dir):
+            if name.endswith(".seg"):
+                with contextlib.suppress(OSError):
+                    self._segments[int(name[:-4])] = os.path.getsize(os.path.join(self._cache_dir, name))
+        self._active = max(self._segments, default=0)
+
+    def _evict(self):
+        # Runs inside add()'s transaction; the index rows go with the caller's commit.
+        while sum(self._segments.values()) > self._limit_bytes and len(self._segments) > 1:
+            oldest = min(self._segments)
+            self._conn.execute("DELETE FROM reports WHERE segment = ?", (oldest,))
+            # Missing if another process evicted it first; locked while a reader has it open on Windows.
+            with contextlib.suppress(OSError):
+                os.remove(self._segment_path(oldest))
+            logging.info(f"Report cache over {self._limit_bytes / 1048576:.0f} MB; evicted segment {oldest}.")
+            del self._segments[oldest]
+
+    def _segment_path(self, segment):
+        return os.path.join(self._cache_dir, f"{segment:06d}.seg")
+
+    @staticmethod
+    def _number(value):
+        return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+class InFlightUploads:
+    """Single-flight registry: each log is queued and uploaded by at most one caller at a time.
+
+    The watcher, the scanners and the game monitor all claim a log before queueing it; a
+    claim for a log that is already queued or uploading is refused and counted.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = set()
+        self._duplicates_prevented = 0
+
+    @property
+    def duplicates_prevented(self):
+        with self._lock:
+            return self._duplicates_prevented
+
+    def __len__(self):
+        with self._lock:
+            return len(self._flights)
+
+    def claim(self, key):
+        with self._lock:
+            if key in self._flights:
+                self._duplicates_prevented += 1
+                return False
+            self._flights.add(key)
+            return True
+
+    def finish(self, key):
+        with self._lock:
+            self._flights.discard(key)
+
+class FileReadinessTracker:
+    """Holds freshly written logs until their size and mtime have stopped changing.
+
+    Watcher events only (re)start the clock for a file; a single poller thread stats the
+    watched files and hands each one to on_ready once it has been stable for quiet_period.
+    """
+
+    def __init__(self, on_ready, quiet_period=DEFAULT_FILE_QUIET_PERIOD):
+        self._on_ready = on_ready
+        self.quiet_period = quiet_period
+        self._poll_interval = max(0.1, min(0.5, quiet_period / 4))
+        self._files = {}
+        self._cond = threading.Condition()
+        self._running = False
+
+    def __len__(self):
+        with self._cond:
+            return len(self._files)
+
+    def is_watching(self, file_path):
+        with self._cond:
+            return file_path in self._files
+
+    def is_settled(self, file_path):
+        try:
+            return time.time() - os.stat(file_path).st_mtime >= self.quiet_period
+        except OSError:
+            return False
+
+    def touch(self, file_path):
+        with self._cond:
+            self._files[file_path] = {"signature": None, "stable_since": time.monotonic()}
+            self._cond.notify()
+
+    def run(self):
+        self._running = True
+        logging.info(f"Starting file readiness tracker (quiet period {self.quiet_period}s).")
+        while True:
+            with self._cond:
+                while self._running and not self._files:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                self._cond.wait(self._poll_interval)
+                ready = self._collect_ready()
+            for file_path in ready:
+                self._on_ready(file_path)
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+    def _collect_ready(self):
+        now = time.monotonic()
+        ready = []
+        for file_path, state in list(self._files.items()):
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                # Deleted or renamed away (e.g. arcdps replacing .evtc with its zipped .zevtc).
+                del self._files[file_path]
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if signature != state["signature"]:
+                state["signature"] = signature
+                state["stable_since"] = now
+            elif now - state["stable_since"] >= self.quiet_period:
+                del self._files[file_path]
+                ready.append(file_path)
+        return ready
+
+class WebLogEntry:
+    __slots__ = ('permalink', 'boss', 'success', 'upload_time')
+
+    def __init__(self, permalink, boss, success, upload_time):
+        self.permalink = permalink
+        self.boss = boss
+        self.success = bool(success)
+        self.upload_time = upload_time
+
+    def as_dict(self):
+        return {"permalink": self.permalink, "boss": self.boss, "success": self.success, "upload_time": self.upload_time}
+
+class UploadHistory:
+    """Newest-first upload history for the dashboard with a bounded memory footprint.
+
+    The most recent entries live in a fixed-size ring; entries pushed out of it are
+    appended to a session spill file, with their byte offsets kept in a compact array so
+    that any page of older history can be read back with a seek.
+    """
+
+    def __init__(self, max_in_memory=DEFAULT_WEB_HISTORY_LIMIT):
+        self._recent = collections.deque(maxlen=max(1, max_in_memory))
+        self._spill_file = None
+        self._spill_offsets = array('Q')
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._recent) + len(self._spill_offsets)
+
+    def add(self, entry):
+        with self._lock:
+            if len(self._recent) == self._recent.maxlen:
+                self._spill(self._recent.pop())
+            self._recent.appendleft(entry)
+            self.version += 1
+
+    def page(self, offset=0, limit=DASHBOARD_PAGE_SIZE):
+        with self._lock:
+            total = len(self._recent) + len(self._spill_offsets)
+            entries = list(itertools.islice(self._recent, offset, offset + limit))
+            spill_start = max(0, offset - len(self._recent))
+            spill_count = limit - len(entries)
+            if spill_count > 0 and spill_start < len(self._spill_offsets):
+                entries.extend(self._read_spilled(spill_start, spill_count))
+            return total, entries, self.version
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+            self._spill_offsets = array('Q')
+            if self._spill_file:
+                self._spill_file.close()
+                self._spill_file = None
+            self.version += 1
+
+    def _spill(self, entry):
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile()
+        self._spill_file.seek(0, os.SEEK_END)
+        self._spill_offsets.append(self._spill_file.tell())
+        record = [entry.permalink, entry.boss, entry.success, entry.upload_time]
+        self._spill_file.write(json.dumps(record).encode('utf-8') + b'\n')
+
+    def _read_spilled(self, start, count):
+        # The spill file is oldest-first; position 0 of the spilled history is its last line.
+        entries = []
+        newest = len(self._spill_offsets) - 1
+        for position in range(start, min(start + count, len(self._spill_offsets))):
+            self._spill_file.seek(self._spill_offsets[newest - position])
+            entries.append(WebLogEntry(*json.loads(self._spill_file.readline())))
+        return entries
+
+class EventBroadcaster:
+    """Pushes Server-Sent Events to every connected dashboard from a single thread.
+
+    Event-stream sockets are detached from their HTTP handler threads once the response
+    headers are sent, so an idle dashboard tab costs a socket rather than a thread.
+    """
+
+    def __init__(self):
+        self._clients = []
+        self._clients_lock = threading.Lock()
+        self._outbox = queue.Queue()
+        self._running = False
+
+    def __len__(self):
+        with self._clients_lock:
+            return len(self._clients)
+
+    @staticmethod
+    def format_event(event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+
+    def publish(self, event, data):
+        if self._running:
+            self._outbox.put(self.format_event(event, data))
+
+    def add_client(self, sock, initial_payload=b""):
+        sock.settimeout(SSE_SEND_TIMEOUT)
+        try:
+            sock.sendall(b"retry: 3000\n\n" + initial_payload)
+        except OSError:
+            self._close(sock)
+            return
+        with self._clients_lock:
+            self._clients.append(sock)
+
+    def run(self):
+        self._running = True
+        logging.info("Starting dashboard event broadcaster.")
+        while self._running:
+            try:
+                payload = self._outbox.get(timeout=SSE_HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                payload = b": keepalive\n\n"
+            if payload is None:
+                break
+            self._send_to_all(payload)
+        with self._clients_lock:
+            clients, self._clients = self._clients, []
+        for sock in clients:
+            self._close(sock)
+
+    def stop(self):
+        self._running = False
+        self._outbox.put(None)
+
+    def _send_to_all(self, payload):
+        with self._clients_lock:
+            clients = list(self._clients)
+        dead = []
+        for sock in clients:
+            try:
+                sock.sendall(payload)
+            except OSError:
+                dead.append(sock)
+        if dead:
+            with self._clients_lock:
+                self._clients = [sock for sock in self._clients if sock not in dead]
+            for sock in dead:
+                self._close(sock)
+
+    @staticmethod
+    def _close(sock):
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+class PsutilProcessProvider:
+    """The slice of psutil the game tracker needs; swap in a fake to drive it without processes."""
+
+    def __init__(self):
+        import psutil
+        self._psutil = psutil
+
+    def pids(self):
+        return self._psutil.pids()
+
+    def name(self, pid):
+        psutil = self._psutil
+        try:
+            return psutil.Process(pid).name()
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            return None
+
+    def is_alive(self, pid):
+        return self._psutil.pid_exists(pid)
+
+class GameProcessTracker:
+    """Follows the game process by PID instead of sweeping every process on each check.
+
+    While the game runs only its remembered PID is polled. While it is not running the
+    process list is searched on a backoff schedule, and only PIDs that appeared since the
+    previous search have their names looked up.
+    """
+
+    def __init__(self, process_name, on_change, provider=None):
+        self.process_name = process_name
+        self._on_change = on_change
+        self._provider = provider or PsutilProcessProvider()
+        self.pid = None
+        self.is_running = None
+        self._seen_pids = set()
+        self._scans_since_full = 0
+        self._stop_event = threading.Event()
+
+    def check(self):
+        if self.pid is not None:
+            if not (self._provider.is_alive(self.pid) and self._provider.name(self.pid) == self.process_name):
+                logging.info(f"{self.process_name} (PID {self.pid}) has exited.")
+                self.pid = None
+        if self.pid is None:
+            self.pid = self._find_game_pid()
+            if self.pid is not None:
+                logging.info(f"Found {self.process_name} with PID {self.pid}.")
+        running = self.pid is not None
+        if running != self.is_running:
+            self.is_running = running
+            self._on_change(running)
+        return running
+
+    def run(self):
+        logging.info("Starting game process tracker.")
+        scan_interval = GAME_SCAN_MIN_INTERVAL
+        while not self._stop_event.is_set():
+            try:
+                was_running = self.is_running
+                running = self.check()
+            except Exception as e:
+                logging.error("Error while tracking the game process", exc_info=True)
+                running = was_running = False
+            if running:
+                interval = GAME_PID_POLL_INTERVAL
+                scan_interval = GAME_SCAN_MIN_INTERVAL
+            else:
+                if was_running:
+                    scan_interval = GAME_SCAN_MIN_INTERVAL
+                interval = scan_interval
+                scan_interval = min(GAME_SCAN_MAX_INTERVAL, scan_interval * 2)
+            self._stop_event.wait(interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _find_game_pid(self):
+        pids = set(self._provider.pids())
+        self._scans_since_full += 1
+        if self._scans_since_full >= GAME_FULL_RESCAN_EVERY:
+            # A PID that was reused between two searches would otherwise never be looked at again.
+            self._seen_pids = set()
+            self._scans_since_full = 0
+        new_pids = pids - self._seen_pids
+        self._seen_pids = pids
+        for pid in new_pids:
+            if self._provider.name(pid) == self.process_name:
+                return pid
+        return None
+
+class UploaderCore:
+    """Watches the log folder, uploads new logs and tracks what was uploaded, without any UI.
+
+    The tray app subclasses this and overrides the hooks (prompt_for_log_folder, notify_upload)
+    that need a desktop session.
+    """
+
+    def __init__(self):
+        self.config = configparser.ConfigParser()
+        self.status = AppStatus(self)
+        self.folder_to_watch = ""
+        self.web_server_port = 8000
+        self.web_history = UploadHistory()
+        self.dashboard_cache = DashboardPageCache()
+        self.events = EventBroadcaster()
+        self.upload_store = None
+        self.in_flight = InFlightUploads()
+        self.progress = UploadProgress()
+        self.metrics = UploaderMetrics(self)
+        self._queued_at = {}
+        self.metadata = LogMetadataIndex()
+        self.priority_encounters = {}
+        self.file_quiet_period = DEFAULT_FILE_QUIET_PERIOD
+        self.readiness = None
+        self.scanner = None
+        self.upload_workers = DEFAULT_UPLOAD_WORKERS
+        self.upload_url = DPS_REPORT_UPLOAD_URL
+        self.report_cache = None
+        self.report_cache_limit_mb = DEFAULT_REPORT_CACHE_LIMIT_MB
+        self.upload_pipeline = None
+        self.dps_client = None
+        self.upload_limiter = UploadRateLimiter()
+        self.retry_queue = RetryQueue(self.queue_log_file)
+        self.is_sleeping = False
+        self.enable_notifications = True
+        self.enable_autostart = False
+        self.only_while_running = False
+        self.only_after_closing = False
+        self.game_check_active = False
+        self.observer = None
+        self.game_was_running = None
+        self.game_tracker = None
+
+    def start(self):
+        """Open the upload store and start every background service; returns immediately."""
+        self.open_upload_store()
+        self.open_report_cache()
+        self.retry_queue.load()
+        self.start_background_services()
+        logging.info("All services started.")
+
+    def stop(self):
+        if self.observer:
+            self.observer.stop()
+            self.observer.join()
+        self.retry_queue.stop()
+        self.events.stop()
+        if self.game_tracker:
+            self.game_tracker.stop()
+        if self.readiness:
+            self.readiness.stop()
+        if self.upload_pipeline:
+            self.upload_pipeline.stop()
+        if self.dps_client:
+            self.dps_client.close()
+        if self.upload_store:
+            self.upload_store.close()
+        if self.report_cache is not None:
+            self.report_cache.close()
+
+    def prompt_for_log_folder(self):
+        """Ask the user for the log folder when there is no config file yet. Headless: no one to ask."""
+        return None
+
+    def notify_upload(self, boss, success):
+        """Called after each successful upload when notifications are enabled."""
+
+    def setup_config(self):
+        try:
+            if not os.path.exists(CONFIG_FILE):
+                logging.info("Config file not found. Prompting user for log folder.")
+                log_folder = self.prompt_for_log_folder()
+                if not log_folder:
+                    logging.warning("No log folder selected. Exiting.")
+                    sys.exit()
+                self.config['Settings'] = {
+                    'LogFolder': log_folder,
+                    'WebServerPort': '8000',
+                    'EnableAutostart': 'false',
+                    'EnableNotifications': 'true',
+                    'OnlyUploadWhileGameRunning': 'false',
+                    'OnlyUploadAfterGameCloses': 'false',
+                    'UploadWorkers': str(DEFAULT_UPLOAD_WORKERS),
+                    'FileQuietPeriod': str(DEFAULT_FILE_QUIET_PERIOD),
+                    'WebHistoryLimit': str(DEFAULT_WEB_HISTORY_LIMIT),
+                    'PriorityEncounters': '',
+                    'UploadRateWhileGameRunning': str(DEFAULT_UPLOAD_RATE_WHILE_GAME_RUNNING),
+                    'UploadRateWhileGameClosed': str(DEFAULT_UPLOAD_RATE_WHILE_GAME_CLOSED),
+                    'ReportCacheLimitMB': str(DEFAULT_REPORT_CACHE_LIMIT_MB)
+                }
+                with open(CONFIG_FILE, 'w') as configfile:
+                    self.config.write(configfile)
+                logging.info(f"Config saved to {CONFIG_FILE}")
+            
+            self.config.read(CONFIG_FILE)
+            settings = self.config['Settings']
+            dirty_config = False
+            if 'UploadMode' in settings:
+                del settings['UploadMode']
+                dirty_config = True
+            if not settings.get('EnableAutostart'):
+                settings['EnableAutostart'] = 'false'; dirty_config = True
+            if not settings.get('EnableNotifications'):
+                settings['EnableNotifications'] = 'true'; dirty_config = True
+            if not settings.get('OnlyUploadWhileGameRunning'):
+                settings['OnlyUploadWhileGameRunning'] = 'false'; dirty_config = True
+            if not settings.get('OnlyUploadAfterGameCloses'):
+                settings['OnlyUploadAfterGameCloses'] = 'false'; dirty_config = True
+            if not settings.get('UploadWorkers'):
+                settings['UploadWorkers'] = str(DEFAULT_UPLOAD_WORKERS); dirty_config = True
+            if not settings.get('FileQuietPeriod'):
+                settings['FileQuietPeriod'] = str(DEFAULT_FILE_QUIET_PERIOD); dirty_config = True
+            if not settings.get('WebHistoryLimit'):
+                settings['WebHistoryLimit'] = str(DEFAULT_WEB_HISTORY_LIMIT); dirty_config = True
+            if 'PriorityEncounters' not in settings:
+                settings['PriorityEncounters'] = ''; dirty_config = True
+            if not settings.get('UploadRateWhileGameRunning'):
+                settings['UploadRateWhileGameRunning'] = str(DEFAULT_UPLOAD_RATE_WHILE_GAME_RUNNING); dirty_config = True
+            if not settings.get('UploadRateWhileGameClosed'):
+                settings['UploadRateWhileGameClosed'] = str(DEFAULT_UPLOAD_RATE_WHILE_GAME_CLOSED); dirty_config = True
+            if not settings.get('ReportCacheLimitMB'):
+                settings['ReportCacheLimitMB'] = str(DEFAULT_REPORT_CACHE_LIMIT_MB); dirty_config = True
+            
+            if dirty_config:
+                 with open(CONFIG_FILE, 'w') as configfile:
+                    self.config.write(configfile)
+                 logging.info("Updated config file with new default settings.")
+
+            self.folder_to_watch = settings.get('LogFolder')
+            self.web_server_port = settings.getint('WebServerPort')
+            self.enable_autostart = settings.getboolean('EnableAutostart')
+            self.enable_notifications = settings.getboolean('EnableNotifications')
+            self.only_while_running = settings.getboolean('OnlyUploadWhileGameRunning')
+            self.only_after_closing = settings.getboolean('OnlyUploadAfterGameCloses')
+            self.upload_workers = max(1, settings.getint('UploadWorkers'))
+            self.file_quiet_period = max(0.0, settings.getfloat('FileQuietPeriod'))
+            self.web_history = UploadHistory(settings.getint('WebHistoryLimit'))
+            self.upload_limiter = UploadRateLimiter(
+                max(0, settings.getint('UploadRateWhileGameRunning')) * 1024,
+                max(0, settings.getint('UploadRateWhileGameClosed')) * 1024
+            )
+            self.report_cache_limit_mb = max(0, settings.getint('ReportCacheLimitMB'))
+            priority_ids = parse_priority_encounters(settings.get('PriorityEncounters', ''))
+            self.priority_encounters = {
+                encounter_id: len(priority_ids) - rank for rank, encounter_id in enumerate(priority_ids)
+            }
+            
+            self.game_check_active = self.only_while_running or self.only_after_closing
+
+            logging.info(f"Watching folder: {self.folder_to_watch}")
+            logging.info(f"Autostart enabled: {self.enable_autostart}")
+            logging.info(f"Notifications enabled: {self.enable_notifications}")
+            logging.info(f"Game check active: {self.game_check_active}")
+            logging.info(f"Upload workers: {self.upload_workers}")
+            logging.info(self.upload_limiter.describe())
+            logging.info(f"Report cache limit: {self.report_cache_limit_mb} MB")
+            if priority_ids:
+                logging.info(f"Priority encounters: {priority_ids}")
+
+        except Exception as e:
+            logging.critical("CRASH in setup_config", exc_info=True)
+            raise
+
+    def start_background_services(self):
+        self.status.set("PENDING", "Starting services...")
+        self.scanner = IncrementalLogScanner(self.folder_to_watch)
+        self.dps_client = DpsReportClient(
+            upload_url=self.upload_url, pool_size=self.upload_workers, limiter=self.upload_limiter
+        )
+        self.upload_pipeline = UploadPipeline(self.handle_log_file, self.upload_workers, on_idle=self.on_uploads_idle)
+        self.upload_pipeline.start()
+        self.readiness = FileReadinessTracker(self.queue_log_file, self.file_quiet_period)
+        threading.Thread(target=self.readiness.run, daemon=True).start()
+        threading.Thread(target=self.events.run, daemon=True).start()
+        threading.Thread(target=self.start_web_server, daemon=True).start()
+        # The watcher is running before the startup scan begins, so a log written while the
+        # scan walks the folder is seen by one or the other, not left for the periodic scan.
+        try:
+            self.start_file_watcher()
+        except Exception as e:
+            logging.error("Could not start file watcher; relying on the periodic scan", exc_info=True)
+        threading.Thread(target=self.periodic_scan_loop, daemon=True).start()
+        threading.Thread(target=self.retry_queue.run, daemon=True).start()
+        threading.Thread(target=self.throttle_report_loop, daemon=True).start()
+
+        if self.game_check_active or self.upload_limiter.is_game_sensitive:
+            self.game_tracker = GameProcessTracker(GAME_PROCESS_NAME, self.on_game_state_changed)
+            threading.Thread(target=self.game_tracker.run, daemon=True).start()
+        if not self.game_check_active:
+            self.is_sleeping = False
+            threading.Thread(target=self.scan_and_upload_existing_logs, daemon=True).start()
+
+    def throttle_report_loop(self):
+        while True:
+            time.sleep(THROTTLE_REPORT_INTERVAL)
+            if len(self.events):
+                self.events.publish("throttle", {"details": self.upload_limiter.describe()})
+
+    def periodic_scan_loop(self):
+        logging.info("Starting periodic backup scanner.")
+        while True:
+            time.sleep(60)
+            if not self.is_sleeping:
+                logging.info("Periodic scanner waking up to check for missed files.")
+                self.scan_and_upload_existing_logs(set_status=False)
+
+    def on_game_state_changed(self, game_is_running):
+        self.upload_limiter.set_game_running(game_is_running)
+        if self.game_check_active:
+            self.check_game_state_and_update(game_is_running)
+
+    def check_game_state_and_update(self, game_is_running):
+        try:
+            if self.game_was_running is None or game_is_running != self.game_was_running:
+                logging.info(f"Game state change detected. Running: {game_is_running}. Previous: {self.game_was_running}")
+                
+                can_upload_now = (self.only_while_running and game_is_running) or \
+                                 (self.only_after_closing and not game_is_running) or \
+                                 (self.only_while_running and self.only_after_closing)
+
+                if can_upload_now:
+                    self.is_sleeping = False
+                    self.status.set("PENDING", "State changed, waking up...")
+                    # Scan on its own thread so the tracker keeps polling the game meanwhile.
+                    threading.Thread(target=self.scan_and_upload_existing_logs, daemon=True).start()
+                else:
+                    self.is_sleeping = True
+                    if self.only_while_running:
+                        self.status.set("SLEEPING", f"Waiting for {GAME_PROCESS_NAME}...")
+                    elif self.only_after_closing:
+                        self.status.set("SLEEPING", "Waiting for you to close GW2...")
+
+            self.game_was_running = game_is_running
+        except Exception as e:
+            logging.error("Error in check_game_state_and_update", exc_info=True)
+
+    def open_upload_store(self):
+        self.upload_store = UploadStore(UPLOADED_LOGS_DB_FILE, self.folder_to_watch)
+        try:
+            self.upload_store.open()
+        except Exception as e:
+            logging.critical("Could not open upload store", exc_info=True)
+            raise
+
+    def open_report_cache(self):
+        if not self.report_cache_limit_mb:
+            logging.info("Report cache disabled.")
+            return
+        self.report_cache = ReportCache(REPORT_CACHE_DIR, self.report_cache_limit_mb * 1048576)
+        try:
+            self.report_cache.open()
+        except Exception as e:
+            # The cache only adds history; uploads keep working without it.
+            logging.error("Could not open report cache", exc_info=True)
+            self.report_cache = None
+
+    def cache_report(self, file_path, data):
+        if self.report_cache is None:
+            return
+        try:
+            self.report_cache.add(self.upload_store.relative_key(file_path), data)
+        except Exception as e:
+            logging.error(f"Could not cache report for {os.path.basename(file_path)}", exc_info=True)
+
+    def handle_log_file(self, file_path):
+        started = time.monotonic()
+        queued_at = self._queued_at.pop(file_path, None)
+        if queued_at is not None:
+            self.metrics.queue_wait_seconds.observe(started - queued_at)
+        key = self.upload_store.relative_key(file_path)
+        try:
+            if self.is_sleeping: return
+            filename = os.path.basename(file_path)
+            # Re-checked while holding the claim: an earlier claim for this log may have
+            # finished between the caller's check and this one.
+            if self.upload_store.is_processed(file_path):
+                self.retry_queue.discard(file_path)
+                return
+            self.upload_log_to_dps_report(file_path, filename)
+        finally:
+            self.in_flight.finish(key)
+            self.metadata.discard(file_path)
+            self.progress.complete()
+            if not self.is_sleeping:
+                self.status.set("UPLOADING", self.progress.describe())
+            self.metrics.handle_seconds.observe(time.monotonic() - started)
+
+    def queue_log_file(self, file_path):
+        if self.is_sleeping or not self.upload_pipeline: return False
+        key = self.upload_store.relative_key(file_path)
+        if not self.in_flight.claim(key):
+            logging.info(f"{os.path.basename(file_path)} is already queued; skipped duplicate upload.")
+            return True
+        self.progress.add()
+        self._queued_at[file_path] = time.monotonic()
+        if not self.upload_pipeline.submit(file_path, self.upload_priority(file_path)):
+            self._queued_at.pop(file_path, None)
+            self.progress.discard()
+            self.in_flight.finish(key)
+            return False
+        return True
+
+    def upload_priority(self, file_path):
+        # Sort key for the upload queue: configured encounters first, then newest first.
+        header = self.metadata.get(file_path)
+        if header is None:
+            try:
+                return (0, -os.path.getmtime(file_path))
+            except OSError:
+                return (0, 0)
+        return (-self.priority_encounters.get(header.encounter_id, 0), -header.mtime)
+
+    def on_uploads_idle(self):
+        logging.info(f"Upload batch finished: {self.progress.describe()}.")
+        self.progress.reset()
+        if not self.is_sleeping:
+            self.status.set("UP TO DATE", "All logs processed.")
+
+    def upload_log_to_dps_report(self, file_path, filename):
+        if self.is_sleeping: return
+        import requests
+        started = time.monotonic()
+        result = "failed"
+        try:
+            size, content_hash = file_fingerprint(file_path)
+            previous = self.upload_store.find_by_content(size, content_hash)
+            if previous:
+                # Same log copied or moved to another folder: reuse the earlier report.
+                logging.info(f"Skipping {filename}: identical content already uploaded as {previous['permalink']}.")
+                self.upload_store.record_upload(
+                    file_path, size, content_hash, previous['permalink'], previous['boss'], previous['success'],
+                    datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 0
+                )
+                self.retry_queue.discard(file_path)
+                result = "reused"
+                return
+            data, transfer = self.dps_client.upload(file_path, filename)
+            result = "uploaded"
+            self.metrics.bytes_sent.inc(amount=transfer['bytes_sent'])
+            self.metrics.bytes_saved.inc(amount=transfer['bytes_saved'])
+            logging.info(
+                f"Successfully uploaded {filename}. URL: {data.get('permalink')} "
+                f"({transfer['bytes_sent']} bytes in {transfer['seconds']:.1f}s, "
+                f"{transfer['bytes_per_second'] / 1024:.0f} KB/s, {transfer['bytes_saved']} bytes saved)"
+            )
+            upload_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            boss = data.get('encounter', {}).get('boss', 'Unknown')
+            success = data.get('encounter', {}).get('success', False)
+            self.upload_store.record_upload(
+                file_path, size, content_hash, data.get('permalink'), boss, success, upload_time,
+                transfer['bytes_sent']
+            )
+            self.retry_queue.discard(file_path)
+            self.add_web_log(WebLogEntry(data.get('permalink'), boss, success, upload_time))
+            self.cache_report(file_path, data)
+            
+            if self.enable_notifications:
+                try:
+                    self.notify_upload(boss, success)
+                except Exception as e:
+                    logging.error("Failed to show notification", exc_info=True)
+
+        except RetryableUploadError as e:
+            result = "retry"
+            self.metrics.upload_errors.inc(error_class(e))
+            logging.warning(f"Upload of {filename} failed: {e}")
+            if e.disconnected:
+                self.status.set("DISCONNECTED", "Connection to dps.report failed.")
+            self.retry_queue.schedule(file_path, e.retry_after)
+        except requests.exceptions.RequestException as e:
+            self.metrics.upload_errors.inc(error_class(e))
+            logging.error(f"Error uploading {filename}", exc_info=True)
+            self.retry_queue.discard(file_path)
+        except Exception as e:
+            self.metrics.upload_errors.inc(error_class(e))
+            logging.error(f"An unexpected error occurred during upload of {filename}", exc_info=True)
+            self.retry_queue.discard(file_path)
+        finally:
+            self.metrics.uploads.inc(result)
+            self.metrics.upload_seconds.observe(time.monotonic() - started, result)
+
+    def scan_and_upload_existing_logs(self, set_status=True):
+        if self.is_sleeping: return
+        if set_status:
+            self.status.set("UPLOADING", "Performing initial scan...")
+        started = time.monotonic()
+        found = self.scanner.scan(self.upload_store.filter_unprocessed)
+        self.metrics.scan_seconds.observe(time.monotonic() - started)
+        self.metrics.scan_found.inc(amount=len(found))
+        unprocessed_logs = [file_path for file_path in found if not self.retry_queue.is_scheduled(file_path)]
+        stats = self.scanner.last_stats
+        logging.info(
+            f"Scan found {len(unprocessed_logs)} new logs in {stats['directories']} folders "
+            f"({stats['directories_unchanged']} unchanged, {stats['entries_skipped']} entries skipped)."
+        )
+        if not unprocessed_logs:
+            if not self.is_sleeping and set_status:
+                self.status.set("UP TO DATE", "All logs processed.")
+            return
+        unprocessed_logs.sort(key=self.upload_priority)
+        total = len(unprocessed_logs)
+        if set_status:
+            self.status.set("UPLOADING", f"Initial scan queued {total} logs.")
+        for file_path in unprocessed_logs:
+            if self.is_sleeping: break
+            # Backlog files are queued straight away; only a log arcdps may still be writing
+            # goes through the readiness wait.
+            if self.readiness.is_watching(file_path):
+                continue
+            if not self.readiness.is_settled(file_path):
+                self.readiness.touch(file_path)
+            elif not self.queue_log_file(file_path):
+                break
+
+    def start_web_server(self):
+        from arcdps_uploader_web import DashboardServer, WebDashboardHandler
+        def handler(*args, **kwargs):
+            WebDashboardHandler(self, *args, **kwargs)
+        try:
+            server = DashboardServer(('', self.web_server_port), handler)
+            logging.info(f"Web server started at http://localhost:{self.web_server_port}")
+            server.serve_forever()
+        except Exception as e:
+            self.status.set("DISCONNECTED", f"Web server failed: {e}")
+            logging.critical("Could not start web server", exc_info=True)
+
+    def add_web_log(self, log):
+        self.web_history.add(log)
+        self.events.publish("upload", log.as_dict())
+
+    def get_web_logs(self, offset=0, limit=DASHBOARD_PAGE_SIZE):
+        return self.web_history.page(offset, limit)
+
+    def clear_web_session(self):
+        self.web_history.clear()
+        logging.info("Web session cleared.")
+
+    def start_file_watcher(self):
+        if not os.path.isdir(self.folder_to_watch):
+            self.status.set("DISCONNECTED", "Log folder not found!")
+            return
+        from watchdog.observers import Observer
+        from watchdog import events
+        event_handler = LogUploaderEventHandler(self)
+        self.observer = Observer()
+        # Only the events the handler acts on; without the filter inotify also reports every
+        # open and close, including the uploader's own reads of each log.
+        event_filter = [
+            events.FileCreatedEvent, events.FileModifiedEvent, events.FileMovedEvent,
+            events.DirCreatedEvent, events.DirMovedEvent
+        ]
+        try:
+            self.observer.schedule(event_handler, self.folder_to_watch, recursive=True, event_filter=event_filter)
+        except TypeError:
+            # watchdog before 4.0 has no event filters.
+            self.observer.schedule(event_handler, self.folder_to_watch, recursive=True)
+        self.observer.start()
+        logging.info(f"File watcher started for: {self.folder_to_watch}")
+
+class LogUploaderEventHandler:
+    """watchdog event handler. The observer only calls dispatch(), so this does not need to
+    subclass FileSystemEventHandler and the core loads without watchdog installed."""
+
+    def __init__(self, app_instance):
+        self.app = app_instance
+
+    def dispatch(self, event):
+        self.app.metrics.watcher_events.inc(event.event_type)
+        if event.event_type in ('created', 'modified'):
+            self._track(event, event.src_path)
+        elif event.event_type == 'moved':
+            self._track(event, event.dest_path)
+
+    def _track(self, event, file_path):
+        if self.app.is_sleeping:
+            return
+        if event.is_directory:
+            if event.event_type != 'modified':
+                self._track_directory(file_path)
+        elif file_path.endswith(LOG_EXTENSIONS):
+            self.app.readiness.touch(file_path)
+
+    def _track_directory(self, dir_path):
+        # A log written right after arcdps creates its folder can land before the watch on that
+        # folder is in place, so pick up whatever the new folder already holds.
+        for current, _, filenames in os.walk(dir_path):
+            for filename in filenames:
+                if filename.endswith(LOG_EXTENSIONS):
+                    self.app.readiness.touch(os.path.join(current, filename))
+
+class DashboardPageCache:
+    """Keeps the last rendered dashboard page and re-renders only when its inputs change."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key = None
+        self._body = None
+        self._etag = None
+
+    def get(self, key, render):
+        with self._lock:
+            if key != self._key:
+                self._body = render().encode('utf-8')
+                self._etag = f'"{hashlib.sha1(self._body).hexdigest()[:20]}"'
+                self._key = key
+            return self._body, self._etag
+
+class BackfillRunner:
+    """Headless bulk upload of an existing log archive (the --backfill command).
+
+    Uploads go through the same upload pipeline, dps.report client and upload store as the
+    tray app. Every finished upload is checkpointed to the store in batches, so an
+    interrupted run resumes with exactly the logs that were not recorded yet.
+    """
+
+    def __init__(self, log_folder, workers=DEFAULT_BACKFILL_WORKERS, upload_url=DPS_REPORT_UPLOAD_URL,
+                 db_file=UPLOADED_LOGS_DB_FILE, checkpoint_every=STORE_COMMIT_BATCH, report_cache=None):
+        self.log_folder = log_folder
+        self.workers = max(1, workers)
+        self.store = UploadStore(db_file, log_folder, commit_batch=checkpoint_every)
+        self.client = DpsReportClient(upload_url=upload_url, pool_size=self.workers)
+        self.report_cache = report_cache
+        self.progress = UploadProgress()
+        self.counts = {"uploaded": 0, "reused": 0, "failed": 0}
+        self._counts_lock = threading.Lock()
+        self._done = threading.Event()
+
+    def run(self):
+        started = time.monotonic()
+        self.store.open()
+        pipeline = UploadPipeline(self.upload_one, self.workers, on_idle=self._on_idle)
+        interrupted = False
+        try:
+            if self.report_cache is not None:
+                self.report_cache.open()
+            try:
+                pending = IncrementalLogScanner(self.log_folder).scan(self.store.filter_unprocessed)
+                pending.sort(key=self.newest_first)
+                print(f"Backfill: {len(pending)} logs to upload from {self.log_folder} with {self.workers} workers.")
+                if pending:
+                    pipeline.start()
+                    self.progress.add(len(pending))
+                    for file_path in pending:
+                        pipeline.submit(file_path)
+                    while not self._done.wait(BACKFILL_PROGRESS_INTERVAL):
+                        print(f"Backfill: {self.progress.describe()}")
+            except KeyboardInterrupt:
+                interrupted = True
+                print("Backfill interrupted; finishing uploads in flight...")
+            try:
+                # Uploads in flight are waited for, however long they take, so each one is
+                # checkpointed before the store closes and is not sent again on the next run.
+                pipeline.stop(timeout=None)
+            except KeyboardInterrupt:
+                interrupted = True
+        finally:
+            self.store.close()
+            self.client.close()
+            if self.report_cache is not None:
+                self.report_cache.close()
+        self.print_summary(time.monotonic() - started, interrupted)
+        return 1 if interrupted or self.counts["failed"] else 0
+
+    def _on_idle(self):
+        # The queue can run dry while logs are still being submitted; the run is only done
+        # once every log counted in progress has been handled.
+        if self.progress.is_complete:
+            self._done.set()
+
+    @staticmethod
+    def newest_first(file_path):
+        # A log moved or deleted since the scan sorts last; upload_one reports it as failed.
+        try:
+            return -os.path.getmtime(file_path)
+        except OSError:
+            return 0
+
+    def upload_one(self, file_path):
+        filename = os.path.basename(file_path)
+        try:
+            size, content_hash = file_fingerprint(file_path)
+            previous = self.store.find_by_content(size, content_hash)
+            if previous:
+                self.store.record_upload(
+                    file_path, size, content_hash, previous['permalink'], previous['boss'], previous['success'],
+                    datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 0
+                )
+                self._count("reused")
+                return
+            for attempt in range(BACKFILL_MAX_ATTEMPTS):
+                try:
+                    data, transfer = self.client.upload(file_path, filename)
+                    break
+                except RetryableUploadError as e:
+                    if attempt + 1 == BACKFILL_MAX_ATTEMPTS:
+                        raise
+                    delay = RetryQueue.backoff_delay(attempt)
+                    time.sleep(max(delay, e.retry_after or 0))
+            encounter = data.get('encounter', {})
+            self.store.record_upload(
+                file_path, size, content_hash, data.get('permalink'), encounter.get('boss', 'Unknown'),
+                encounter.get('success', False), datetime.now().strftime("%Y-%m-%d %H:%M:%S"), transfer['bytes_sent']
+            )
+            self._count("uploaded")
+            if self.report_cache is not None:
+                try:
+                    self.report_cache.add(self.store.relative_key(file_path), data)
+                except Exception as e:
+                    logging.error(f"Could not cache report for {filename}: {e}")
+        except Exception as e:
+            logging.error(f"Backfill failed to upload {filename}: {e}")
+            self._count("failed")
+        finally:
+            self.progress.complete()
+
+    def print_summary(self, elapsed, interrupted):
+        stats = self.client.stats()
+        processed = sum(self.counts.values())
+        print(
+            f"Backfill {'stopped' if interrupted else 'finished'} in {format_duration(elapsed)}: "
+            f"{self.counts['uploaded']} uploaded, {self.counts['reused']} already uploaded elsewhere, "
+            f"{self.counts['failed']} failed."
+        )
+        if elapsed > 0:
+            print(
+                f"Throughput: {processed / elapsed:.1f} logs/s, {stats['bytes_sent'] / elapsed / 1048576:.2f} MB/s "
+                f"({stats['bytes_sent'] / 1048576:.1f} MB sent, {stats['bytes_saved'] / 1048576:.1f} MB saved by compression)."
+            )
+        if interrupted or self.counts['failed']:
+            print("Run the same command again to resume with the remaining logs.")
+
+    def _count(self, key):
+        with self._counts_lock:
+            self.counts[key] += 1
+
+def read_configured_log_folder():
+    config = configparser.ConfigParser()
+    config.read(CONFIG_FILE)
+    return config.get('Settings', 'LogFolder', fallback=None)
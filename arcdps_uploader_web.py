@@ -0,0 +1,440 @@
+import json
+import html
+import hashlib
+import time
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from arcdps_uploader_core import APP_NAME, API_MAX_LIMIT, DASHBOARD_PAGE_SIZE, EventBroadcaster
+
+# Local web dashboard. Loaded by UploaderCore.start_web_server, so the http.server/email
+# stack stays out of the core's import time.
+
+# Request paths reported individually in the request metrics; anything else counts as "other".
+METRIC_PATHS = ('/', '/clear', '/api/logs', '/api/stats', '/api/reports', '/api/reports/bosses', '/metrics', '/events')
+REPORT_PATH_PREFIX = '/api/reports/'
+
+class DashboardServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._detached = set()
+        self._detached_lock = threading.Lock()
+
+    def detach(self, request):
+        """Keep a request's socket open after its handler returns; the caller now owns it."""
+        with self._detached_lock:
+            self._detached.add(request)
+
+    def shutdown_request(self, request):
+        with self._detached_lock:
+            if request in self._detached:
+                self._detached.discard(request)
+                return
+        super().shutdown_request(request)
+
+DASHBOARD_SCRIPT = """
+<script>
+(function () {
+    var body = document.getElementById('log-rows');
+
+    function addRow(log, atTop) {
+        var row = body.insertRow(atTop ? 0 : -1);
+        row.insertCell().textContent = log.boss;
+        var result = row.insertCell();
+        result.textContent = log.success ? 'Success' : 'Fail';
+        result.className = log.success ? 'status-success' : 'status-fail';
+        row.insertCell().textContent = log.upload_time;
+        var link = document.createElement('a');
+        link.href = log.permalink;
+        link.target = '_blank';
+        link.textContent = log.permalink;
+        row.insertCell().appendChild(link);
+    }
+
+    var button = document.getElementById('load-more');
+    if (button) {
+        button.addEventListener('click', function () {
+            var offset = parseInt(button.dataset.offset, 10);
+            fetch('/api/logs?offset=' + offset + '&limit=' + button.dataset.limit)
+                .then(function (response) { return response.json(); })
+                .then(function (page) {
+                    page.logs.forEach(function (log) { addRow(log, false); });
+                    offset += page.logs.length;
+                    button.dataset.offset = offset;
+                    if (offset >= page.total || !page.logs.length) button.remove();
+                });
+        });
+    }
+
+    var history = document.getElementById('report-history');
+    if (history) {
+        var filters = document.getElementById('report-filters');
+        var reportRows = document.getElementById('report-rows');
+        var more = document.getElementById('reports-more');
+        var summary = document.getElementById('reports-summary');
+        var reportOffset = 0;
+        var reportQuery = '';
+
+        var bossSelect = filters.elements.boss;
+        fetch('/api/reports/bosses')
+            .then(function (response) { return response.json(); })
+            .then(function (page) {
+                page.bosses.forEach(function (entry) {
+                    var option = document.createElement('option');
+                    option.value = entry.boss;
+                    option.textContent = entry.boss + ' (' + entry.reports + ')';
+                    bossSelect.appendChild(option);
+                });
+            });
+
+        function buildQuery() {
+            var params = new URLSearchParams();
+            if (filters.elements.boss.value) params.set('boss', filters.elements.boss.value);
+            if (filters.elements.success.value) params.set('success', filters.elements.success.value);
+            if (filters.elements.days.value) {
+                var days = parseInt(filters.elements.days.value, 10);
+                var since = new Date();
+                since.setHours(0, 0, 0, 0);
+                since.setDate(since.getDate() - days + 1);
+                params.set('since', Math.floor(since.getTime() / 1000));
+            }
+            if (filters.elements.q.value.trim()) params.set('q', filters.elements.q.value.trim());
+            return params.toString();
+        }
+
+        function addReportRow(report) {
+            var row = reportRows.insertRow(-1);
+            row.insertCell().textContent = report.boss || 'Unknown';
+            var result = row.insertCell();
+            result.textContent = (report.success ? 'Success' : 'Fail') + (report.is_cm ? ' (CM)' : '');
+            result.className = report.success ? 'status-success' : 'status-fail';
+            row.insertCell().textContent = new Date(report.encounter_time * 1000).toLocaleString();
+            row.insertCell().textContent = report.duration == null ? '' : report.duration;
+            row.insertCell().textContent = report.comp_dps == null ? '' : report.comp_dps.toLocaleString();
+            var links = row.insertCell();
+            if (report.permalink) {
+                var link = document.createElement('a');
+                link.href = report.permalink;
+                link.target = '_blank';
+                link.textContent = 'dps.report';
+                links.appendChild(link);
+                links.appendChild(document.createTextNode(' | '));
+            }
+            var raw = document.createElement('a');
+            raw.href = '/api/reports/' + report.id;
+            raw.target = '_blank';
+            raw.textContent = 'JSON';
+            links.appendChild(raw);
+        }
+
+        function loadReports(reset) {
+            if (reset) {
+                reportOffset = 0;
+                reportQuery = buildQuery();
+                reportRows.innerHTML = '';
+            }
+            fetch('/api/reports?' + reportQuery + (reportQuery ? '&' : '') + 'offset=' + reportOffset + '&limit=' + more.dataset.limit)
+                .then(function (response) { return response.json(); })
+                .then(function (page) {
+                    page.reports.forEach(addReportRow);
+                    reportOffset += page.reports.length;
+                    summary.textContent = page.total + ' cached report' + (page.total === 1 ? '' : 's') + ' match.';
+                    more.style.display = reportOffset >= page.total || !page.reports.length ? 'none' : '';
+                });
+        }
+
+        filters.addEventListener('submit', function (event) {
+            event.preventDefault();
+            loadReports(true);
+        });
+        filters.addEventListener('change', function () { loadReports(true); });
+        more.addEventListener('click', function () { loadReports(false); });
+        loadReports(true);
+    }
+
+    if (!window.EventSource) return;
+    var events = new EventSource('/events');
+    events.addEventListener('upload', function (message) {
+        var placeholder = document.getElementById('no-logs');
+        if (placeholder) placeholder.remove();
+        addRow(JSON.parse(message.data), true);
+        if (button) button.dataset.offset = parseInt(button.dataset.offset, 10) + 1;
+    });
+    events.addEventListener('throttle', function (message) {
+        document.getElementById('throttle').textContent = JSON.parse(message.data).details;
+    });
+    events.addEventListener('status', function (message) {
+        var status = JSON.parse(message.data);
+        document.getElementById('status').textContent = 'Status: ' + status.status + ' - ' + status.details;
+    });
+})();
+</script>
+"""
+
+class WebDashboardHandler(BaseHTTPRequestHandler):
+    def __init__(self, app_instance, *args, **kwargs):
+        self.app = app_instance
+        BaseHTTPRequestHandler.__init__(self, *args, **kwargs)
+
+    def do_GET(self):
+        started = time.perf_counter()
+        url = urlsplit(self.path)
+        self.response_status = None
+        try:
+            if url.path == '/clear':
+                self.app.clear_web_session()
+                self.send_response(302)
+                self.send_header('Location', '/')
+                self.end_headers()
+                return
+            if url.path == '/api/logs':
+                self.send_logs_api(parse_qs(url.query))
+                return
+            if url.path == '/events':
+                self.open_event_stream()
+                return
+            if url.path == '/metrics':
+                self.send_uncached(
+                    self.app.metrics.render_prometheus().encode('utf-8'), "text/plain; version=0.0.4; charset=utf-8"
+                )
+                return
+            if url.path == '/api/reports':
+                self.send_reports_api(parse_qs(url.query))
+                return
+            if url.path == '/api/reports/bosses':
+                self.send_report_bosses()
+                return
+            if url.path.startswith(REPORT_PATH_PREFIX):
+                self.send_report(url.path[len(REPORT_PATH_PREFIX):])
+                return
+            if url.path == '/api/stats':
+                stats = self.app.metrics.as_dict()
+                stats["status"] = self.app.status.as_event()
+                self.send_uncached(json.dumps(stats).encode('utf-8'), "application/json")
+                return
+            body, etag = self.app.dashboard_cache.get(self.get_page_key(), self.get_html_content)
+            self.send_cached(body, etag, "text/html; charset=utf-8")
+        except Exception as e:
+            logging.error("Error handling web request", exc_info=True)
+            self.send_error(500, "Internal Server Error")
+            self.end_headers()
+            self.wfile.write(b"<h1>500 - Internal Server Error</h1><p>Check app_log.txt for details.</p>")
+        finally:
+            if url.path in METRIC_PATHS:
+                path = url.path
+            elif url.path.startswith(REPORT_PATH_PREFIX):
+                path = REPORT_PATH_PREFIX + "{id}"
+            else:
+                path = "other"
+            self.app.metrics.http_requests.inc(path, self.response_status)
+            self.app.metrics.http_seconds.observe(time.perf_counter() - started, path)
+
+    def send_response(self, code, message=None):
+        self.response_status = code
+        super().send_response(code, message)
+
+    def send_uncached(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_cached(self, body, etag, content_type):
+        if etag in self.headers.get('If-None-Match', ''):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def open_event_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.close_connection = True
+        initial = EventBroadcaster.format_event("throttle", {"details": self.app.upload_limiter.describe()})
+        if self.app.status:
+            initial += EventBroadcaster.format_event("status", self.app.status.as_event())
+        self.server.detach(self.connection)
+        self.app.events.add_client(self.connection, initial)
+
+    def send_logs_api(self, query):
+        try:
+            offset = max(0, int(query.get('offset', ['0'])[0]))
+            limit = min(API_MAX_LIMIT, max(1, int(query.get('limit', [str(DASHBOARD_PAGE_SIZE)])[0])))
+        except ValueError:
+            self.send_error(400, "offset and limit must be integers")
+            return
+        total, logs, _ = self.app.get_web_logs(offset, limit)
+        body = json.dumps({
+            "total": total, "offset": offset, "limit": limit, "logs": [log.as_dict() for log in logs]
+        }).encode('utf-8')
+        # Hashed like the dashboard page: the history version restarts at 0 with the app, so an
+        # ETag built from it could match a stale response the browser kept from an earlier run.
+        self.send_cached(body, f'"{hashlib.sha1(body).hexdigest()[:20]}"', "application/json")
+
+    def send_reports_api(self, query):
+        cache = self.app.report_cache
+        if cache is None:
+            self.send_error(404, "The report cache is disabled")
+            return
+        try:
+            offset = max(0, int(query.get('offset', ['0'])[0]))
+            limit = min(API_MAX_LIMIT, max(1, int(query.get('limit', [str(DASHBOARD_PAGE_SIZE)])[0])))
+            since = int(query['since'][0]) if 'since' in query else None
+            until = int(query['until'][0]) if 'until' in query else None
+        except ValueError:
+            self.send_error(400, "offset, limit, since and until must be integers")
+            return
+        success = query.get('success', [''])[0].lower()
+        if success not in ('', 'true', 'false', '1', '0'):
+            self.send_error(400, "success must be true or false")
+            return
+        total, reports = cache.search(
+            boss=query.get('boss', [None])[0], success=success in ('true', '1') if success else None,
+            since=since, until=until, text=query.get('q', [None])[0], offset=offset, limit=limit
+        )
+        body = json.dumps({"total": total, "offset": offset, "limit": limit, "reports": reports}).encode('utf-8')
+        self.send_uncached(body, "application/json")
+
+    def send_report_bosses(self):
+        bosses = self.app.report_cache.bosses() if self.app.report_cache else []
+        body = json.dumps({"bosses": [{"boss": boss, "reports": count} for boss, count in bosses]})
+        self.send_uncached(body.encode('utf-8'), "application/json")
+
+    def send_report(self, report_id):
+        report = None
+        if self.app.report_cache is not None and report_id.isdigit():
+            report = self.app.report_cache.get(int(report_id))
+        if report is None:
+            self.send_error(404, "Report not found in the local cache")
+            return
+        self.send_uncached(json.dumps(report).encode('utf-8'), "application/json")
+
+    def log_message(self, format, *args):
+        logging.info("%s - %s" % (self.address_string(), format % args))
+
+    def get_page_key(self):
+        stats = self.app.dps_client.stats() if self.app.dps_client else None
+        return self.app.web_history.version, self.app.in_flight.duplicates_prevented, stats and stats['uploads']
+
+    def get_transfer_summary(self):
+        if not self.app.dps_client:
+            return "No uploads yet."
+        stats = self.app.dps_client.stats()
+        rate = stats['bytes_sent'] / stats['seconds'] / 1024 if stats['seconds'] > 0 else 0
+        return (
+            f"Uploaded {stats['bytes_sent'] / 1048576:.1f} MB in {stats['uploads']} logs "
+            f"({rate:.0f} KB/s average), {stats['bytes_saved'] / 1048576:.1f} MB saved by compression."
+        )
+
+    @staticmethod
+    def render_log_row(log):
+        status_class = "status-success" if log.success else "status-fail"
+        status_text = "Success" if log.success else "Fail"
+        permalink = html.escape(str(log.permalink), quote=True)
+        return (
+            f"<tr><td>{html.escape(str(log.boss))}</td>"
+            f'<td class="{status_class}">{status_text}</td>'
+            f"<td>{log.upload_time}</td>"
+            f'<td><a href="{permalink}" target="_blank">{permalink}</a></td></tr>'
+        )
+
+    def get_report_history(self):
+        if self.app.report_cache is None:
+            return ""
+        return f"""
+                <section id="report-history">
+                    <h2>Report History</h2>
+                    <form id="report-filters">
+                        <select name="boss"><option value="">All bosses</option></select>
+                        <select name="success">
+                            <option value="">Any result</option>
+                            <option value="true">Success</option>
+                            <option value="false">Fail</option>
+                        </select>
+                        <select name="days">
+                            <option value="">Any time</option>
+                            <option value="1">Today</option>
+                            <option value="7">Last 7 days</option>
+                            <option value="30">Last 30 days</option>
+                        </select>
+                        <input type="search" name="q" placeholder="Search boss or log path">
+                        <button type="submit" class="button">Search</button>
+                    </form>
+                    <p id="reports-summary"></p>
+                    <table>
+                        <thead><tr><th>Boss</th><th>Result</th><th>Encounter Time</th><th>Duration</th><th>Group DPS</th><th>Report</th></tr></thead>
+                        <tbody id="report-rows"></tbody>
+                    </table>
+                    <button id="reports-more" class="button" data-limit="{DASHBOARD_PAGE_SIZE}" style="display: none">Load more reports</button>
+                </section>"""
+
+    def get_html_content(self):
+        total, logs, _ = self.app.get_web_logs(0, DASHBOARD_PAGE_SIZE)
+        if not logs:
+            log_rows = '<tr id="no-logs"><td colspan="4" style="text-align:center; padding: 20px;">Awaiting new logs...</td></tr>'
+        else:
+            log_rows = "\n".join(self.render_log_row(log) for log in logs)
+        load_more = ''
+        if total > len(logs):
+            load_more = (
+                f'<button id="load-more" class="button" data-offset="{len(logs)}" '
+                f'data-limit="{DASHBOARD_PAGE_SIZE}">Load older logs</button>'
+            )
+        return f"""
+        <!DOCTYPE html>
+        <html lang="en">
+        <head>
+            <meta charset="UTF-8">
+            <meta name="viewport" content="width=device-width, initial-scale=1.0">
+            <title>{APP_NAME}</title>
+            <style>
+                body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif; background-color: #1a1a1a; color: #e0e0e0; margin: 0; padding: 2rem; }}
+                .container {{ max-width: 1000px; margin: 0 auto; }}
+                h1 {{ color: #eee; border-bottom: 2px solid #444; padding-bottom: 10px; }}
+                table {{ width: 100%; border-collapse: collapse; margin-top: 20px; }}
+                th, td {{ padding: 12px 15px; text-align: left; border-bottom: 1px solid #333; }}
+                th {{ background-color: #2c2c2c; }}
+                tr:nth-child(even) {{ background-color: #252525; }}
+                a {{ color: #3498db; text-decoration: none; }}
+                a:hover {{ text-decoration: underline; }}
+                .status-success {{ color: #2ecc71; font-weight: bold; }}
+                .status-fail {{ color: #e74c3c; font-weight: bold; }}
+                .button {{ background-color: #3498db; color: white; padding: 10px 15px; border: none; border-radius: 5px; cursor: pointer; text-decoration: none; display: inline-block; margin-top: 1rem; }}
+                .button:hover {{ background-color: #2980b9; }}
+                #report-filters select, #report-filters input {{ background-color: #2c2c2c; color: #e0e0e0; border: 1px solid #444; border-radius: 5px; padding: 8px; margin-right: 6px; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <h1>{APP_NAME}</h1>
+                <p id="status"></p>
+                <p>Watching folder: <code>{html.escape(self.app.folder_to_watch)}</code></p>
+                <p>Duplicate uploads prevented: {self.app.in_flight.duplicates_prevented}</p>
+                <p>{self.get_transfer_summary()}</p>
+                <p id="throttle"></p>
+                <a href="/clear" class="button">Clear Session View</a>
+                <table>
+                    <thead><tr><th>Boss</th><th>Encounter Result</th><th>Upload Time</th><th>dps.report Link</th></tr></thead>
+                    <tbody id="log-rows">{log_rows}</tbody>
+                </table>
+                {load_more}
+                {self.get_report_history()}
+            </div>
+            {DASHBOARD_SCRIPT}
+        </body>
+        </html>
+        """
@@ -0,0 +1,286 @@
+"""Behaviour checks for the uploader core that need no network and no desktop.
+
+Each check runs against the local dps.report stand-in or in-process fakes and prints one
+line; the script exits with status 1 if any check fails.
+
+  retry_queue          - DpsReportClient and RetryQueue against the stand-in answering 429
+                         and 503: Retry-After is honoured, the backoff grows with each
+                         attempt, and upload_retries.json brings the attempt counts back
+                         after a restart, when the due uploads are retried
+  backfill_checkpoints - a --backfill run with N uploads and --checkpoint-every K commits
+                         the upload store about N/K times, not once per upload
+  backfill_completes   - a --backfill run whose uploads finish faster than logs are queued
+                         still handles every log before it reports success
+  game_tracker         - GameProcessTracker against a fake process provider: start and exit
+                         detection, the periodic full rescan that catches a reused PID, and
+                         the search backoff schedule
+
+    python benchmarks/checks.py
+    python benchmarks/checks.py --only backfill_checkpoints
+"""
+import os
+import sys
+import time
+import json
+import random
+import argparse
+import tempfile
+import threading
+import contextlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import loggen
+from fake_dps_report import FakeDpsReport
+from arcdps_uploader_core import (
+    GAME_FULL_RESCAN_EVERY, GAME_PID_POLL_INTERVAL, GAME_SCAN_MAX_INTERVAL, GAME_SCAN_MIN_INTERVAL,
+    RETRY_BASE_DELAY, RETRY_MAX_DELAY, STORE_COMMIT_INTERVAL, BackfillRunner, DpsReportClient,
+    GameProcessTracker, RetryableUploadError, RetryQueue
+)
+
+GAME = "Gw2-64.exe"
+
+class CheckFailed(Exception):
+    pass
+
+def expect(condition, message):
+    if not condition:
+        raise CheckFailed(message)
+
+def check_retry_queue(retry_after=45, attempts=4):
+    server = FakeDpsReport(retry_after=retry_after, seed=1).start()
+    client = DpsReportClient(upload_url=server.upload_url, pool_size=1)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            log = os.path.join(tmp, "logs", "Sabetha", "20240101-000000.zevtc")
+            loggen.write_log(log, 15375, 4096, random.Random(1))
+            state_file = os.path.join(tmp, "upload_retries.json")
+            submitted = []
+
+            def upload(file_path, queue):
+                submitted.append(file_path)
+                try:
+                    client.upload(file_path, os.path.basename(file_path))
+                except RetryableUploadError as e:
+                    queue.schedule(file_path, e.retry_after)
+                    return e
+                queue.discard(file_path)
+                return None
+
+            def scheduled_delay():
+                with open(state_file) as f:
+                    entry = json.load(f)[log]
+                return entry["attempts"], entry["next_attempt"] - time.time()
+
+            # 429 with Retry-After: the retry is not scheduled before dps.report asked for.
+            queue = RetryQueue(lambda path: None, state_file=state_file)
+            server.rate_limit_rate = 1.0
+            error = upload(log, queue)
+            expect(error is not None and error.status_code == 429, f"expected a retryable 429, got {error!r}")
+            expect(error.retry_after == retry_after, f"Retry-After parsed as {error.retry_after}, sent {retry_after}")
+            count, delay = scheduled_delay()
+            expect(count == 1 and delay >= retry_after - 1, f"retry after 429 scheduled in {delay:.1f}s, not {retry_after}s")
+
+            # 503 without Retry-After: each attempt waits within its doubling backoff window.
+            server.rate_limit_rate, server.error_rate = 0.0, 1.0
+            delays = []
+            for attempt in range(1, attempts):
+                error = upload(log, queue)
+                expect(error is not None and error.status_code == 503, f"expected a retryable 503, got {error!r}")
+                count, delay = scheduled_delay()
+                window = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+                expect(count == attempt + 1, f"attempt count {count}, expected {attempt + 1}")
+                expect(window / 2 - 1 <= delay <= window, f"attempt {attempt} delayed {delay:.1f}s, outside {window / 2}-{window}s")
+                delays.append(delay)
+            expect(delays == sorted(delays), f"backoff did not grow: {[round(d, 1) for d in delays]}")
+
+            # Restart: a new queue reads the attempt counts back and retries the log at once.
+            server.error_rate = 0.0
+            restarted = RetryQueue(lambda path: upload(path, restarted), state_file=state_file)
+            restarted.load()
+            with open(state_file) as f:
+                expect(json.load(f)[log]["attempts"] == attempts, "attempt count lost before the restart")
+            expect(restarted.is_scheduled(log), "restarted queue did not load the pending retry")
+            submitted.clear()
+            worker = threading.Thread(target=restarted.run, daemon=True)
+            worker.start()
+            retried = wait_until(lambda: len(restarted) == 0, 10)
+            restarted.stop()
+            worker.join(5)
+            expect(retried and submitted == [log], f"pending retry not uploaded after restart (submitted {submitted})")
+            with open(state_file) as f:
+                expect(json.load(f) == {}, "uploaded log left in upload_retries.json")
+    finally:
+        client.close()
+        server.stop()
+    return (
+        f"429 retried after {retry_after}s, 503 backoff {[round(d, 1) for d in delays]}s, "
+        f"{attempts} attempts reloaded and retried after restart"
+    )
+
+def wait_until(condition, timeout, interval=0.05):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(interval)
+    return True
+
+def check_backfill_checkpoints(logs=100, checkpoint_every=25):
+    server = FakeDpsReport(seed=1).start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            log_folder = os.path.join(tmp, "logs")
+            loggen.generate_tree(log_folder, logs, size=4096)
+            runner = BackfillRunner(
+                log_folder, workers=4, upload_url=server.upload_url,
+                db_file=os.path.join(tmp, "uploaded_logs.db"), checkpoint_every=checkpoint_every
+            )
+            commits = []
+            open_store = runner.store.open
+
+            def open_and_count(*args, **kwargs):
+                open_store(*args, **kwargs)
+                # Schema setup is done; count only the commits made while uploading.
+                runner.store._conn.set_trace_callback(
+                    lambda statement: commits.append(statement) if statement.upper() == "COMMIT" else None
+                )
+
+            runner.store.open = open_and_count
+            started = time.monotonic()
+            with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                status = runner.run()
+            elapsed = time.monotonic() - started
+    finally:
+        server.stop()
+    expect(status == 0 and runner.counts["uploaded"] == logs, f"backfill did not upload all logs: {runner.counts}")
+    # Full batches, plus the periodic flusher and the final commit on close.
+    allowed = logs // checkpoint_every + int(elapsed / STORE_COMMIT_INTERVAL) + 1
+    expect(
+        len(commits) <= allowed,
+        f"{len(commits)} commits for {logs} uploads with --checkpoint-every {checkpoint_every} (at most {allowed})"
+    )
+    return f"{len(commits)} commits for {logs} uploads with --checkpoint-every {checkpoint_every}"
+
+def check_backfill_completes(logs=300, runs=10):
+    handled = []
+    switch_interval = sys.getswitchinterval()
+    with tempfile.TemporaryDirectory() as tmp:
+        log_folder = os.path.join(tmp, "logs")
+        loggen.generate_tree(log_folder, logs, size=256)
+        # Instant uploads and frequent thread switches let the queue run dry between submits.
+        sys.setswitchinterval(1e-6)
+        try:
+            for run in range(runs):
+                runner = BackfillRunner(log_folder, workers=4, db_file=os.path.join(tmp, f"uploaded_logs-{run}.db"))
+                runner.upload_one = lambda file_path, runner=runner: (runner._count("reused"), runner.progress.complete())
+                with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                    status = runner.run()
+                handled.append(sum(runner.counts.values()))
+                expect(status == 0, f"run {run} exited with status {status}")
+        finally:
+            sys.setswitchinterval(switch_interval)
+    expect(all(count == logs for count in handled), f"logs handled per run: {handled}, expected {logs} each")
+    return f"{runs} runs handled all {logs} logs"
+
+class FakeProcessProvider:
+    """Process table for GameProcessTracker; counts the calls the tracker makes."""
+
+    def __init__(self, processes):
+        self.processes = dict(processes)
+        self.calls = {"pids": 0, "is_alive": 0, "name": 0}
+
+    def pids(self):
+        self.calls["pids"] += 1
+        return list(self.processes)
+
+    def is_alive(self, pid):
+        self.calls["is_alive"] += 1
+        return pid in self.processes
+
+    def name(self, pid):
+        self.calls["name"] += 1
+        return self.processes.get(pid)
+
+class ScriptedStopEvent:
+    """Stands in for the tracker's stop event: records each wait and runs the next step of a
+    script instead of sleeping; stops the tracker when the script is done."""
+
+    def __init__(self, steps):
+        self.steps = list(steps)
+        self.waits = []
+
+    def is_set(self):
+        return not self.steps
+
+    def wait(self, timeout):
+        self.waits.append(timeout)
+        self.steps.pop(0)()
+        return self.is_set()
+
+def check_game_tracker():
+    changes = []
+    provider = FakeProcessProvider({pid: "svchost.exe" for pid in range(100, 200)})
+    tracker = GameProcessTracker(GAME, changes.append, provider=provider)
+
+    expect(tracker.check() is False and changes == [False], f"no game: reported {changes}")
+    lookups = provider.calls["name"]
+    tracker.check()
+    expect(provider.calls["name"] == lookups, "a second search looked up names of PIDs it had already seen")
+
+    provider.processes[300] = GAME
+    expect(tracker.check() and tracker.pid == 300 and changes[-1] is True, "game start not detected")
+    before = dict(provider.calls)
+    for _ in range(5):
+        tracker.check()
+    expect(provider.calls["pids"] == before["pids"], "the process list was searched while the game ran")
+
+    del provider.processes[300]
+    expect(tracker.check() is False and changes[-1] is False, "game exit not detected")
+
+    # PID reuse: an already seen PID now belongs to the game, so only a full rescan finds it.
+    provider.processes[150] = GAME
+    checks = 1
+    while not tracker.check():
+        checks += 1
+        expect(checks <= GAME_FULL_RESCAN_EVERY, f"reused PID not found within {GAME_FULL_RESCAN_EVERY} searches")
+    expect(tracker.pid == 150, f"found PID {tracker.pid} instead of the reused PID 150")
+    expect(changes == [False, True, False, True], f"unexpected state changes {changes}")
+
+    # Backoff: searches slow down while the game is closed, its PID is polled while it runs,
+    # and the search restarts at the fastest interval once it exits.
+    provider = FakeProcessProvider({100: "svchost.exe"})
+    tracker = GameProcessTracker(GAME, lambda running: None, provider=provider)
+    start_game = lambda: provider.processes.__setitem__(200, GAME)
+    stop_game = lambda: provider.processes.pop(200)
+    idle = lambda: None
+    tracker._stop_event = ScriptedStopEvent([idle, idle, idle, start_game, idle, stop_game, idle, idle])
+    tracker.run()
+    backoff = [min(GAME_SCAN_MAX_INTERVAL, GAME_SCAN_MIN_INTERVAL * 2 ** step) for step in range(4)]
+    schedule = backoff + [GAME_PID_POLL_INTERVAL, GAME_PID_POLL_INTERVAL] + backoff[:2]
+    expect(tracker._stop_event.waits == schedule, f"wait schedule {tracker._stop_event.waits}, expected {schedule}")
+    return f"start/exit detected, reused PID found after {checks} searches, schedule {schedule}"
+
+CHECKS = {
+    "retry_queue": check_retry_queue,
+    "backfill_checkpoints": check_backfill_checkpoints,
+    "backfill_completes": check_backfill_completes,
+    "game_tracker": check_game_tracker,
+}
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Run behaviour checks for the uploader core.")
+    parser.add_argument('--only', choices=sorted(CHECKS), action='append', help="run only this check")
+    args = parser.parse_args(argv)
+    failed = 0
+    for name in args.only or CHECKS:
+        try:
+            print(f"PASS {name}: {CHECKS[name]()}")
+        except CheckFailed as e:
+            failed += 1
+            print(f"FAIL {name}: {e}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
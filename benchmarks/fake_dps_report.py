@@ -0,0 +1,133 @@
+"""Local stand-in for dps.report's /uploadContent?json=1 endpoint.
+
+Reads the multipart upload, waits for the configured latency and answers with a JSON body
+shaped like dps.report's (permalink + encounter). A share of requests can be answered with
+HTTP 429 (with Retry-After) or 503 instead, to exercise the uploader's retry and backoff
+paths.
+
+    python benchmarks/fake_dps_report.py --port 18999 --latency 0.2 --error-rate 0.05
+
+then point the uploader at http://127.0.0.1:18999/uploadContent?json=1.
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+FILENAME_PATTERN = re.compile(rb'filename="([^"]*)"')
+
+class FakeDpsReport(ThreadingHTTPServer):
+    """dps.report stand-in. Keeps per-status counters and the arrival time of every upload."""
+
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, latency_jitter=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=1, seed=None):
+        super().__init__(('127.0.0.1', port), FakeDpsReportHandler)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.responses = {}
+        self.bytes_received = 0
+        self.received = {}
+        self._thread = None
+
+    @property
+    def upload_url(self):
+        return f"http://127.0.0.1:{self.server_port}/uploadContent?json=1&generator=ei"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": sum(self.responses.values()),
+                "responses": {str(code): count for code, count in sorted(self.responses.items())},
+                "bytes_received": self.bytes_received,
+                "uploads": len(self.received)
+            }
+
+    def pick_response(self):
+        with self.lock:
+            roll = self.rng.random()
+            delay = max(0.0, self.latency + self.rng.uniform(-self.latency_jitter, self.latency_jitter))
+        if roll < self.rate_limit_rate:
+            return 429, delay
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 503, delay
+        return 200, delay
+
+    def record(self, status, nbytes, filename):
+        with self.lock:
+            self.responses[status] = self.responses.get(status, 0) + 1
+            self.bytes_received += nbytes
+            if status == 200 and filename:
+                self.received.setdefault(filename, time.monotonic())
+
+class FakeDpsReportHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        match = FILENAME_PATTERN.search(body[:4096])
+        filename = match.group(1).decode('utf-8', 'replace') if match else None
+        status, delay = self.server.pick_response()
+        time.sleep(delay)
+        if status == 200:
+            number = len(self.server.received) + 1
+            payload = json.dumps({
+                "id": f"bench-{number}",
+                "permalink": f"https://dps.report/bench-{number}",
+                "encounter": {"boss": "Benchmark Golem", "success": number % 4 != 0}
+            }).encode('utf-8')
+        else:
+            payload = json.dumps({"error": "busy"}).encode('utf-8')
+        self.server.record(status, len(body), filename)
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', str(self.server.retry_after))
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Run a local dps.report stand-in.")
+    parser.add_argument('--port', type=int, default=18999)
+    parser.add_argument('--latency', type=float, default=0.2, help="seconds before each response")
+    parser.add_argument('--latency-jitter', type=float, default=0.0, help="+/- random seconds added to --latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of uploads answered with 503")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="share of uploads answered with 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="Retry-After seconds sent with 429")
+    args = parser.parse_args(argv)
+    server = FakeDpsReport(
+        args.port, args.latency, args.latency_jitter, args.error_rate, args.rate_limit_rate, args.retry_after
+    )
+    print(f"Fake dps.report listening on {server.upload_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.stats(), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
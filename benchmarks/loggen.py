@@ -0,0 +1,90 @@
+"""Synthetic arcdps log trees for the benchmarks.
+
+Logs are laid out like arcdps writes them (<log folder>/<boss>/<account>/<timestamp>.zevtc)
+and start with a valid 16-byte EVTC header, so the uploader's header parsing and
+prioritisation see realistic input. The body is filler that compresses about as well as
+real combat data.
+
+    python benchmarks/loggen.py /tmp/bench-logs --count 10000 --depth 2
+"""
+import os
+import sys
+import time
+import random
+import struct
+import zipfile
+import argparse
+
+EVTC_HEADER = struct.Struct('<4s8sBHx')
+ENCOUNTERS = {
+    15438: "Vale Guardian", 15429: "Gorseval", 15375: "Sabetha", 16123: "Slothasor",
+    16115: "Matthias", 16235: "Keep Construct", 16246: "Xera", 17194: "Cairn",
+    17172: "Mursaat Overseer", 17188: "Samarog", 17154: "Deimos", 19767: "Soulless Horror",
+    19450: "Dhuum", 43974: "Conjured Amalgamate", 21105: "Twin Largos", 20934: "Qadim",
+}
+
+def evtc_bytes(encounter_id, size, rng):
+    """A raw .evtc body of `size` bytes: header, then semi-repetitive event records."""
+    header = EVTC_HEADER.pack(b'EVTC', b'20240612', 1, encounter_id)
+    record = rng.randbytes(64)
+    body = bytearray(header)
+    while len(body) < size:
+        # Repeated records with some noise, roughly as compressible as real event streams.
+        body += record * 48 + rng.randbytes(1024)
+    return bytes(body[:max(size, EVTC_HEADER.size)])
+
+def write_log(path, encounter_id, size, rng, mtime=None):
+    data = evtc_bytes(encounter_id, size, rng)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if path.endswith('.zevtc'):
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(os.path.basename(path)[:-len('.zevtc')] + '.evtc', data)
+    else:
+        with open(path, 'wb') as f:
+            f.write(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+def log_path(root, index, depth, rng, extension='.zevtc'):
+    encounter_id = rng.choice(list(ENCOUNTERS))
+    parts = [ENCOUNTERS[encounter_id]]
+    for level in range(1, depth):
+        parts.append(f"Account{rng.randrange(3)}" if level == 1 else f"dir{level}-{rng.randrange(4)}")
+    name = f"20240101-{index // 3600 % 24:02d}{index // 60 % 60:02d}{index % 60:02d}-{index:06d}{extension}"
+    return os.path.join(root, *parts[:depth], name), encounter_id
+
+def generate_tree(root, count, depth=2, size=64 * 1024, evtc_share=0.1, age=86400, seed=1):
+    """Write `count` logs under `root`, `depth` folders deep, mtimes spread over the last `age`
+    seconds. Returns the paths written."""
+    rng = random.Random(seed)
+    now = time.time()
+    paths = []
+    for index in range(count):
+        extension = '.evtc' if rng.random() < evtc_share else '.zevtc'
+        path, encounter_id = log_path(root, index, depth, rng, extension)
+        log_size = int(size * rng.uniform(0.5, 1.5))
+        paths.append(write_log(path, encounter_id, log_size, rng, now - age + age * index / max(count, 1)))
+    # Folders get the time of their newest log, as if the tree had been written over `age`
+    # seconds, so scans treat them as settled rather than as being written right now.
+    for current, _, filenames in os.walk(root, topdown=False):
+        newest = max((os.path.getmtime(os.path.join(current, name)) for name in filenames), default=now - age)
+        os.utime(current, (newest, newest))
+    return paths
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Generate a synthetic arcdps log tree.")
+    parser.add_argument('root', help="folder to create the logs in")
+    parser.add_argument('--count', type=int, default=1000, help="number of logs")
+    parser.add_argument('--depth', type=int, default=2, help="folder levels below the root (boss/account/...)")
+    parser.add_argument('--size', type=int, default=64 * 1024, help="average uncompressed log size in bytes")
+    parser.add_argument('--evtc-share', type=float, default=0.1, help="fraction of uncompressed .evtc logs")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+    started = time.monotonic()
+    paths = generate_tree(args.root, args.count, args.depth, args.size, args.evtc_share, seed=args.seed)
+    print(f"Wrote {len(paths)} logs to {args.root} in {time.monotonic() - started:.1f}s.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
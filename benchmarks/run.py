@@ -0,0 +1,376 @@
+"""Benchmark scenarios for the uploader core, against a local dps.report stand-in.
+
+Scenarios (each runs in its own interpreter and temporary folder):
+  initial_scan  - folder scan time for growing synthetic trees (first start, restart with
+                  everything uploaded, periodic rescan of an unchanged tree), then
+                  uploading a backlog end to end
+  steady_state  - idle CPU while watching, then logs arriving one by one: time from a log
+                  being written to dps.report receiving it
+  burst         - many logs arriving at once: time until all are uploaded, and throughput
+  dashboard     - concurrent requests against the web dashboard, /api/logs, /metrics and
+                  /api/stats
+
+Results are written as JSON (--output) together with the commit and machine they were
+measured on; --compare prints each number next to the one in an earlier result file.
+
+    python benchmarks/run.py --output before.json
+    python benchmarks/run.py --output after.json --compare before.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import http.client
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import loggen
+from fake_dps_report import FakeDpsReport
+
+SCENARIOS = ('initial_scan', 'steady_state', 'burst', 'dashboard')
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {
+        "count": len(values), "p50": round(pick(0.5), 4), "p95": round(pick(0.95), 4),
+        "p99": round(pick(0.99), 4), "max": round(values[-1], 4)
+    }
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def fake_server(args):
+    return FakeDpsReport(
+        latency=args.latency, latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, seed=1
+    ).start()
+
+def start_core(log_folder, upload_url, args, web_port=None):
+    """Start an UploaderCore in the current directory, configured for the benchmark."""
+    import arcdps_uploader_core
+    os.makedirs(log_folder, exist_ok=True)
+    with open(arcdps_uploader_core.CONFIG_FILE, 'w') as f:
+        f.write(
+            "[Settings]\n"
+            f"LogFolder = {log_folder}\n"
+            f"WebServerPort = {web_port or free_port()}\n"
+            "EnableNotifications = false\n"
+            f"UploadWorkers = {args.workers}\n"
+            f"FileQuietPeriod = {args.quiet_period}\n"
+            "UploadRateWhileGameRunning = 0\n"
+            "UploadRateWhileGameClosed = 0\n"
+        )
+    core = arcdps_uploader_core.UploaderCore()
+    core.setup_config()
+    core.upload_url = upload_url
+    core.start()
+    return core
+
+def wait_for(condition, timeout, interval=0.01):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(interval)
+    return True
+
+def scenario_initial_scan(args):
+    from arcdps_uploader_core import IncrementalLogScanner, UploadStore
+    results = {"trees": []}
+    for count in args.scan_sizes:
+        root = os.path.abspath(f"scan-{count}")
+        paths = loggen.generate_tree(root, count, depth=args.depth, size=args.log_size)
+        store = UploadStore(f"scan-{count}.db", root, commit_batch=1000)
+        store.open(legacy_tracker_file=None)
+        started = time.perf_counter()
+        found = IncrementalLogScanner(root).scan(store.filter_unprocessed)
+        cold = time.perf_counter() - started
+        for index, path in enumerate(paths):
+            store.record_upload(path, 0, str(index), None, None, True, "", 0)
+        scanner = IncrementalLogScanner(root)
+        started = time.perf_counter()
+        scanner.scan(store.filter_unprocessed)
+        restart = time.perf_counter() - started
+        started = time.perf_counter()
+        scanner.scan(store.filter_unprocessed)
+        periodic = time.perf_counter() - started
+        store.close()
+        results["trees"].append({
+            "logs": count, "found": len(found), "directories": scanner.last_stats["directories"],
+            "cold_scan_s": round(cold, 4), "restart_all_uploaded_s": round(restart, 4),
+            "periodic_rescan_s": round(periodic, 4)
+        })
+
+    server = fake_server(args)
+    log_folder = os.path.abspath("backlog")
+    loggen.generate_tree(log_folder, args.backlog, depth=args.depth, size=args.log_size, seed=2)
+    core = start_core(log_folder, server.upload_url, args)
+    started = time.monotonic()
+    done = wait_for(lambda: len(core.upload_store) >= args.backlog, args.timeout)
+    elapsed = time.monotonic() - started
+    results["backlog"] = {
+        "logs": args.backlog, "uploaded": len(core.upload_store), "completed": done,
+        "seconds": round(elapsed, 3), "logs_per_second": round(len(core.upload_store) / elapsed, 2),
+        "server": server.stats()
+    }
+    core.stop()
+    server.stop()
+    return results
+
+def scenario_steady_state(args):
+    server = fake_server(args)
+    log_folder = os.path.abspath("logs")
+    core = start_core(log_folder, server.upload_url, args)
+    wait_for(lambda: core.observer is not None and core.observer.is_alive(), 10)
+
+    cpu_started, wall_started = time.process_time(), time.monotonic()
+    time.sleep(args.idle_seconds)
+    idle_cpu = (time.process_time() - cpu_started) / (time.monotonic() - wall_started)
+
+    rng = random.Random(3)
+    written = {}
+    cpu_started = time.process_time()
+    for index in range(args.steady_logs):
+        path, encounter_id = loggen.log_path(log_folder, index, args.depth, rng)
+        loggen.write_log(path, encounter_id, args.log_size, rng)
+        written[os.path.basename(path)] = time.monotonic()
+        time.sleep(args.steady_interval)
+    wait_for(lambda: all(name in server.received for name in written), args.timeout)
+    latencies = [server.received[name] - created for name, created in written.items() if name in server.received]
+    result = {
+        "idle_cpu_percent": round(idle_cpu * 100, 3),
+        "logs": args.steady_logs,
+        "interval_s": args.steady_interval,
+        "quiet_period_s": args.quiet_period,
+        "write_to_upload_s": percentiles(latencies),
+        "cpu_seconds": round(time.process_time() - cpu_started, 3),
+        "server": server.stats()
+    }
+    core.stop()
+    server.stop()
+    return result
+
+def scenario_burst(args):
+    server = fake_server(args)
+    log_folder = os.path.abspath("logs")
+    core = start_core(log_folder, server.upload_url, args)
+    wait_for(lambda: core.observer is not None and core.observer.is_alive(), 10)
+
+    rng = random.Random(4)
+    started = time.monotonic()
+    cpu_started = time.process_time()
+    for index in range(args.burst):
+        path, encounter_id = loggen.log_path(log_folder, index, args.depth, rng)
+        loggen.write_log(path, encounter_id, args.log_size, rng)
+    written = time.monotonic() - started
+    done = wait_for(lambda: len(core.upload_store) >= args.burst, args.timeout)
+    elapsed = time.monotonic() - started
+    arrivals = sorted(server.received.values())
+    result = {
+        "logs": args.burst,
+        "uploaded": len(core.upload_store),
+        "completed": done,
+        "write_seconds": round(written, 3),
+        "first_upload_s": round(arrivals[0] - started, 3) if arrivals else None,
+        "all_uploaded_s": round(elapsed, 3),
+        "logs_per_second": round(len(core.upload_store) / elapsed, 2),
+        "cpu_seconds": round(time.process_time() - cpu_started, 3),
+        "server": server.stats()
+    }
+    core.stop()
+    server.stop()
+    return result
+
+def scenario_dashboard(args):
+    from arcdps_uploader_core import WebLogEntry
+    server = fake_server(args)
+    port = free_port()
+    core = start_core(os.path.abspath("logs"), server.upload_url, args, web_port=port)
+    for index in range(args.history):
+        core.add_web_log(WebLogEntry(
+            f"https://dps.report/bench-{index}", "Benchmark Golem", index % 4 != 0, "2024-01-01 00:00:00"
+        ))
+    wait_for(lambda: http_get(port, "/")[0] == 200, 10, 0.05)
+    etag = http_get(port, "/")[1]
+
+    endpoints = {
+        "page": ("/", {}),
+        "page_not_modified": ("/", {"If-None-Match": etag}),
+        "api_logs": ("/api/logs?offset={offset}&limit=100", {}),
+        "metrics": ("/metrics", {}),
+        "api_stats": ("/api/stats", {})
+    }
+    latencies = {name: [] for name in endpoints}
+    errors = []
+    stop_at = time.monotonic() + args.dashboard_seconds
+
+    def client(number):
+        request = 0
+        while time.monotonic() < stop_at:
+            name = list(endpoints)[request % len(endpoints)]
+            path, headers = endpoints[name]
+            path = path.format(offset=(request * 100) % max(args.history, 1))
+            started = time.perf_counter()
+            try:
+                http_get(port, path, headers)
+                latencies[name].append(time.perf_counter() - started)
+            except OSError as e:
+                errors.append(str(e))
+            request += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(args.clients)]
+    cpu_started = time.process_time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result = {
+        "clients": args.clients,
+        "history": args.history,
+        "seconds": args.dashboard_seconds,
+        "requests_per_second": round(sum(map(len, latencies.values())) / args.dashboard_seconds, 1),
+        "errors": len(errors),
+        "cpu_seconds": round(time.process_time() - cpu_started, 3),
+        "latency_s": {name: percentiles(values) for name, values in latencies.items()}
+    }
+    core.stop()
+    server.stop()
+    return result
+
+def http_get(port, path, headers=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        connection.request('GET', path, headers=headers or {})
+        response = connection.getresponse()
+        response.read()
+        return response.status, response.getheader('ETag')
+    except OSError:
+        return None, None
+    finally:
+        connection.close()
+
+def run_scenario(name, args):
+    """Run one scenario in a fresh interpreter and temporary folder; returns its metrics."""
+    command = [sys.executable, os.path.abspath(__file__), '--only', name] + args.passthrough
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"}
+    return json.loads(result.stdout)
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current, previous, path=""):
+    """Yield (metric, previous, current) for every number present in both results."""
+    if isinstance(current, dict) and isinstance(previous, dict):
+        for key, value in current.items():
+            if key in previous:
+                yield from compare(value, previous[key], f"{path}.{key}" if path else key)
+    elif isinstance(current, list) and isinstance(previous, list):
+        for index, (value, old) in enumerate(zip(current, previous)):
+            yield from compare(value, old, f"{path}[{index}]")
+    elif isinstance(current, (int, float)) and isinstance(previous, (int, float)) and not isinstance(current, bool):
+        yield path, previous, current
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Run the uploader benchmarks.")
+    parser.add_argument('scenarios', nargs='*', metavar='SCENARIO', help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('--output', help="write the JSON results to this file")
+    parser.add_argument('--compare', help="earlier result file to compare against")
+    parser.add_argument('--only', choices=SCENARIOS, help=argparse.SUPPRESS)
+    tree = parser.add_argument_group("synthetic logs")
+    tree.add_argument('--scan-sizes', type=lambda v: [int(n) for n in v.split(',')], default=[1000, 5000],
+                      help="comma-separated tree sizes for initial_scan")
+    tree.add_argument('--depth', type=int, default=2, help="folder levels below the log folder")
+    tree.add_argument('--log-size', type=int, default=64 * 1024, help="average uncompressed log size")
+    server = parser.add_argument_group("dps.report stand-in")
+    server.add_argument('--latency', type=float, default=0.05, help="seconds per upload response")
+    server.add_argument('--latency-jitter', type=float, default=0.02)
+    server.add_argument('--error-rate', type=float, default=0.0, help="share of uploads answered with 503")
+    server.add_argument('--rate-limit-rate', type=float, default=0.0, help="share of uploads answered with 429")
+    uploader = parser.add_argument_group("uploader")
+    uploader.add_argument('--workers', type=int, default=2, help="UploadWorkers")
+    uploader.add_argument('--quiet-period', type=float, default=0.5, help="FileQuietPeriod")
+    uploader.add_argument('--timeout', type=float, default=300, help="give up waiting for uploads after this")
+    load = parser.add_argument_group("scenario sizes")
+    load.add_argument('--backlog', type=int, default=300, help="logs uploaded end to end in initial_scan")
+    load.add_argument('--idle-seconds', type=float, default=5, help="idle watching time in steady_state")
+    load.add_argument('--steady-logs', type=int, default=20, help="logs written one by one in steady_state")
+    load.add_argument('--steady-interval', type=float, default=0.5, help="seconds between steady_state logs")
+    load.add_argument('--burst', type=int, default=200, help="logs written at once in burst")
+    load.add_argument('--history', type=int, default=2000, help="dashboard history entries")
+    load.add_argument('--clients', type=int, default=8, help="concurrent dashboard clients")
+    load.add_argument('--dashboard-seconds', type=float, default=5, help="length of the dashboard load")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(sorted(unknown))}")
+    args.passthrough = [
+        arg for index, arg in enumerate(argv)
+        if arg not in SCENARIOS and arg not in ('--output', '--compare')
+        and (index == 0 or argv[index - 1] not in ('--output', '--compare'))
+    ]
+    return args
+
+def main(argv):
+    args = parse_args(argv)
+    if args.only:
+        import logging
+        logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+        with tempfile.TemporaryDirectory(prefix=f"bench-{args.only}-") as workdir:
+            os.chdir(workdir)
+            result = globals()[f"scenario_{args.only}"](args)
+            os.chdir(BENCH_DIR)
+        print(json.dumps(result))
+        return 0
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "arguments": args.passthrough
+        },
+        "scenarios": {}
+    }
+    for name in args.scenarios or SCENARIOS:
+        print(f"Running {name}...", file=sys.stderr)
+        report["scenarios"][name] = run_scenario(name, args)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print(f"\nCompared with {args.compare} ({previous['meta'].get('commit')}):", file=sys.stderr)
+        for metric, old, new in compare(report["scenarios"], previous["scenarios"]):
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            print(f"  {metric}: {old} -> {new} ({change})", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,123 @@
+"""Startup-time benchmark for the uploader.
+
+Measures, each in a fresh interpreter so nothing is cached between runs:
+  - import_core_ms: importing arcdps_uploader_core (the headless watcher/upload/tracker core)
+  - import_app_ms:  importing arcdps_uploader_pro (the tray entry point, without starting it)
+  - store_open_ms:  opening an upload store that already holds --store-rows uploads
+
+Imports are timed with compiled bytecode in place, as in the packaged app; a warm-up run
+per module writes it first, even if PYTHONDONTWRITEBYTECODE is set.
+
+Results are printed as JSON. With --check, the medians are compared against the baseline
+file and the script exits with status 1 when one of them regressed by more than --tolerance.
+Record a new baseline with --save after an intended change.
+
+    python benchmarks/startup.py --check
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_baseline.json")
+
+IMPORT_SNIPPET = """
+import time
+started = time.perf_counter()
+import {module}
+print((time.perf_counter() - started) * 1000)
+"""
+
+STORE_SNIPPET = """
+import time
+from arcdps_uploader_core import UploadStore
+store = UploadStore({db_file!r}, {root!r})
+started = time.perf_counter()
+store.open(legacy_tracker_file=None)
+print((time.perf_counter() - started) * 1000)
+store.close()
+"""
+
+def run_snippet(code):
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=REPO_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+def build_store(db_file, root, rows):
+    sys.path.insert(0, REPO_DIR)
+    from arcdps_uploader_core import UploadStore
+    store = UploadStore(db_file, root, commit_batch=1000)
+    store.open(legacy_tracker_file=None)
+    for i in range(rows):
+        store.record_upload(
+            os.path.join(root, f"Boss {i % 40}", f"{i:08d}.zevtc"), 1000 + i, f"{i:040x}",
+            f"https://dps.report/bench-{i}", f"Boss {i % 40}", i % 3 != 0, "2024-01-01 00:00:00", 1000
+        )
+    store.close()
+
+def measure(runs, store_rows):
+    samples = {"import_core_ms": [], "import_app_ms": [], "store_open_ms": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "uploaded_logs.db")
+        build_store(db_file, tmp, store_rows)
+        for module in ("arcdps_uploader_core", "arcdps_uploader_pro"):
+            run_snippet(IMPORT_SNIPPET.format(module=module))
+        for _ in range(runs):
+            samples["import_core_ms"].append(run_snippet(IMPORT_SNIPPET.format(module="arcdps_uploader_core")))
+            samples["import_app_ms"].append(run_snippet(IMPORT_SNIPPET.format(module="arcdps_uploader_pro")))
+            samples["store_open_ms"].append(run_snippet(STORE_SNIPPET.format(db_file=db_file, root=tmp)))
+    return {
+        "platform": sys.platform,
+        "python": sys.version.split()[0],
+        "runs": runs,
+        "store_rows": store_rows,
+        "results": {
+            name: {"median": round(statistics.median(values), 2), "min": round(min(values), 2)}
+            for name, values in samples.items()
+        }
+    }
+
+def check(report, baseline, tolerance):
+    regressions = []
+    for name, expected in baseline["results"].items():
+        measured = report["results"].get(name)
+        if measured and measured["median"] > expected["median"] * (1 + tolerance):
+            regressions.append(f"{name}: {measured['median']} ms (baseline {expected['median']} ms)")
+    return regressions
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Measure uploader startup time.")
+    parser.add_argument('--runs', type=int, default=15, help="fresh interpreters per measurement")
+    parser.add_argument('--store-rows', type=int, default=20000, help="uploads in the benchmarked store")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline JSON file")
+    parser.add_argument('--check', action='store_true', help="fail if slower than the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="allowed slowdown for --check (0.5 = 50%%)")
+    parser.add_argument('--save', action='store_true', help="write the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    report = measure(args.runs, args.store_rows)
+    print(json.dumps(report, indent=2))
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("platform") != report["platform"]:
+            print(f"Baseline was recorded on {baseline.get('platform')}; comparing anyway.", file=sys.stderr)
+        regressions = check(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))